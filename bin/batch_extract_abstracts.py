@@ -0,0 +1,192 @@
+import csv
+import json
+import logging
+import sys
+from logging import getLogger
+from pathlib import Path
+
+import click
+import dotenv
+import tomllib
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from openai import OpenAI
+
+sys.path.append(str(Path(__file__).parent / ".."))
+
+from viime_extract.batch import (
+    BatchJob,
+    collect_batch_results,
+    prepare_batch_job,
+    submit_batch_job,
+    wait_for_batch_job,
+)
+from viime_extract.config import Config
+
+logging.basicConfig(level=logging.INFO)
+logger = getLogger(Path(__file__).name)
+
+
+def load_config(config_file: str) -> Config:
+    with open(config_file, "rb") as fp:
+        return Config.model_validate(tomllib.load(fp))
+
+
+def read_abstracts(csv_file: str):
+    with open(csv_file, "r", encoding="utf-8") as fp:
+        for row in csv.DictReader(fp):
+            yield row["PMID"], row["Abstract"]
+
+
+@click.group()
+@click.option(
+    "--base-url",
+    envvar="OPENAI_BASE_URL",
+    help="Alternative OpenAI-compatible API endpoint",
+)
+@click.pass_context
+def cli(ctx: click.Context, base_url: str | None):
+    """Extract entities from PubMed CSV exports with the OpenAI Batch API.
+
+    Every step records its progress in the state file, so an interrupted
+    run can be resumed by re-running the same command.
+    """
+    ctx.obj = base_url
+
+
+def get_client(ctx: click.Context) -> OpenAI:
+    return OpenAI(base_url=ctx.obj) if ctx.obj else OpenAI()
+
+
+@cli.command()
+@click.argument("csv_file")
+@click.option("-c", "--config-file", required=True)
+@click.option("-s", "--state-file", required=True)
+@click.option("--with-metadata", is_flag=True, help="Also extract article metadata")
+@click.option("--chunk-size", default=2048, type=int, show_default=True)
+def prepare(
+    csv_file: str,
+    config_file: str,
+    state_file: str,
+    with_metadata=False,
+    chunk_size=2048,
+):
+    """Write the batch input files for every abstract in CSV_FILE."""
+    config = load_config(config_file)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+    job = prepare_batch_job(
+        read_abstracts(csv_file),
+        config,
+        splitter,
+        state_file,
+        with_metadata=with_metadata,
+    )
+    logger.info(
+        "Prepared %d requests in %d batch files", len(job.requests), len(job.parts)
+    )
+
+
+@cli.command()
+@click.option("-s", "--state-file", required=True)
+@click.pass_context
+def submit(ctx: click.Context, state_file: str):
+    """Upload the input files and create the batches."""
+    submit_batch_job(BatchJob.load(state_file), get_client(ctx))
+
+
+@cli.command()
+@click.option("-s", "--state-file", required=True)
+@click.option("--poll-interval", default=60.0, show_default=True)
+@click.pass_context
+def wait(ctx: click.Context, state_file: str, poll_interval=60.0):
+    """Poll the batches until all of them have finished."""
+    wait_for_batch_job(BatchJob.load(state_file), get_client(ctx), poll_interval)
+
+
+@cli.command()
+@click.option("-s", "--state-file", required=True)
+@click.option("-o", "--output-file", required=True)
+@click.option("--metadata-output-file", help="Where to write extracted metadata")
+@click.pass_context
+def collect(
+    ctx: click.Context,
+    state_file: str,
+    output_file: str,
+    metadata_output_file: str | None = None,
+):
+    """Write the PMID to entities mapping from the finished batches."""
+    job = BatchJob.load(state_file)
+    if not job.done:
+        raise click.ClickException("The batches have not finished yet")
+
+    results = collect_batch_results(job, get_client(ctx))
+    failed = sum(len(result.failed_requests) for result in results.values())
+    if failed:
+        logger.warning("%d requests failed and are missing from the output", failed)
+
+    with open(output_file, "w", encoding="utf-8") as fp:
+        json.dump(
+            {pmid: result.keywords.model_dump() for pmid, result in results.items()},
+            fp,
+        )
+
+    if metadata_output_file:
+        with open(metadata_output_file, "w", encoding="utf-8") as fp:
+            json.dump(
+                {
+                    pmid: result.meta.model_dump()
+                    for pmid, result in results.items()
+                    if result.meta is not None
+                },
+                fp,
+            )
+
+
+@cli.command()
+@click.argument("csv_file")
+@click.option("-c", "--config-file", required=True)
+@click.option("-s", "--state-file", required=True)
+@click.option("-o", "--output-file", required=True)
+@click.option("--with-metadata", is_flag=True, help="Also extract article metadata")
+@click.option("--metadata-output-file", help="Where to write extracted metadata")
+@click.option("--chunk-size", default=2048, type=int, show_default=True)
+@click.option("--poll-interval", default=60.0, show_default=True)
+@click.pass_context
+def run(
+    ctx: click.Context,
+    csv_file: str,
+    config_file: str,
+    state_file: str,
+    output_file: str,
+    with_metadata=False,
+    metadata_output_file: str | None = None,
+    chunk_size=2048,
+    poll_interval=60.0,
+):
+    """Prepare, submit, wait for and collect a batch job, resuming if needed."""
+    if not Path(state_file).exists():
+        ctx.invoke(
+            prepare,
+            csv_file=csv_file,
+            config_file=config_file,
+            state_file=state_file,
+            with_metadata=with_metadata,
+            chunk_size=chunk_size,
+        )
+    else:
+        logger.info('Resuming the batch job in "%s"', state_file)
+
+    ctx.invoke(submit, state_file=state_file)
+    ctx.invoke(wait, state_file=state_file, poll_interval=poll_interval)
+    ctx.invoke(
+        collect,
+        state_file=state_file,
+        output_file=output_file,
+        metadata_output_file=metadata_output_file,
+    )
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+
+    # pylint: disable=no-value-for-parameter
+    cli()
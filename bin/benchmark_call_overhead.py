@@ -0,0 +1,60 @@
+import sys
+import timeit
+from pathlib import Path
+
+import click
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+
+sys.path.append(str(Path(__file__).parent / ".."))
+
+from viime_extract.cache import make_cache_key
+from viime_extract.config import ArticleKeywordsPrompt
+from viime_extract.llm import get_structured_runnable
+from viime_extract.schema import ArticleKeyWords
+
+CHUNK = "Plasma lactate and pyruvate were elevated in long COVID patients. " * 12
+
+
+def setup_uncached(model, prompt: ArticleKeywordsPrompt):
+    """The per-chunk setup before templates and runnables were reused."""
+    template = ChatPromptTemplate([("system", prompt.system), ("user", prompt.user)])
+    llm_input = template.invoke({"article_contents": CHUNK})
+    model.with_structured_output(ArticleKeyWords)
+    ArticleKeyWords.model_json_schema()
+    return llm_input
+
+
+def setup_cached(model, prompt: ArticleKeywordsPrompt):
+    llm_input = prompt.get_template().invoke({"article_contents": CHUNK})
+    get_structured_runnable(model, ArticleKeyWords)
+    make_cache_key(model, ArticleKeyWords, llm_input)
+    return llm_input
+
+
+@click.command()
+@click.option("--calls", default=200, show_default=True)
+@click.option("--repeat", default=5, show_default=True)
+def main(calls, repeat):
+    """Times the Python work done for every chunk before the request is sent.
+
+    Nothing is sent to OpenAI; the model only needs to be constructed.
+    """
+    model = ChatOpenAI(model="gpt-4o", api_key="unused")
+    prompt = ArticleKeywordsPrompt(
+        system="Extract the metabolites, proteins, genes, pathways, drugs and"
+        " diseases mentioned in the article.",
+        user="{article_contents}",
+    )
+
+    timings = {}
+    for name, setup in (("uncached", setup_uncached), ("cached", setup_cached)):
+        timings[name] = min(
+            timeit.repeat(lambda: setup(model, prompt), number=calls, repeat=repeat)
+        )
+        click.echo(f"{name:9} {timings[name] / calls * 1e6:8.1f} us per call")
+    click.echo(f"{timings['uncached'] / timings['cached']:.1f}x less overhead")
+
+
+if __name__ == "__main__":
+    main()
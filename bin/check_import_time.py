@@ -0,0 +1,69 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import click
+
+# imported by modules every run needs, these would slow down each CLI start
+HEAVY_MODULES = ("docling", "langchain_docling", "torch", "transformers")
+
+DEFAULT_MODULES = (
+    "viime_extract.config",
+    "viime_extract.extract",
+    "viime_extract.runner",
+)
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Imports `module` in a fresh interpreter and returns the cumulative
+    import time of every module it loaded, in microseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).parent / "..",
+    )
+    if result.returncode != 0:
+        raise click.ClickException(f"Importing {module} failed:\n{result.stderr}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@click.command()
+@click.argument("modules", nargs=-1)
+@click.option(
+    "--max-seconds",
+    type=float,
+    help="Also fail when a module takes longer than this to import",
+)
+def main(modules, max_seconds=None):
+    """Guards the import time of the modules every CLI loads.
+
+    Fails when one of them imports a heavy backend such as docling, which
+    should only be imported when it is used.
+    """
+    failed = False
+    for module in modules or DEFAULT_MODULES:
+        times = import_times(module)
+        seconds = times[module] / 1e6
+        heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_MODULES)
+        click.echo(f"{module:24} {seconds:6.2f} s")
+        if heavy:
+            failed = True
+            click.echo(f"  imports {', '.join(heavy[:5])}", err=True)
+        if max_seconds is not None and seconds > max_seconds:
+            failed = True
+            click.echo(f"  takes longer than {max_seconds:.2f} s", err=True)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
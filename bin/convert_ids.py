@@ -1,20 +1,25 @@
 from pathlib import Path
-import csv
-import heapq
-import httpx
+import asyncio
+import logging
+import sys
 import click
 import re
-import jaro
 
+sys.path.append(str(Path(__file__).parent / ".."))
 
-def bigrams(s: str):
-    return [s[i : i + 2] for i in range(len(s) - 1)]
+from viime_extract.chebi import (
+    MAX_CANDIDATES,
+    ChebiIndex,
+    ChebiMatrix,
+    ExactMatcher,
+    match_brute_force,
+    match_in_parallel,
+    open_chebi_database,
+)
+from viime_extract.cache import ResponseCache
+from viime_extract.pubchem import PUBCHEM_URL, PubChemResolver
 
-
-def dice(a: str, b: str):
-    a = set(bigrams(a.lower()))
-    b = set(bigrams(b.lower()))
-    return 2 * len(a & b) / (len(a) + len(b))
+logger = logging.getLogger(Path(__file__).name)
 
 
 @click.group()
@@ -22,38 +27,36 @@ def cli():
     pass
 
 
-def get_chebi_id(data):
-    for line in data["InformationList"]["Information"][0]["SBURL"]:
-        if "chebiId=CHEBI:" in line:
-            return line.rsplit(":", 1)[1]
-
-
 @cli.command()
 @click.argument("pubchem_ids_file")
-def pubchem_to_chebi(pubchem_ids_file: str):
+@click.option(
+    "--cache-file",
+    default="pubchem-cache.sqlite",
+    show_default=True,
+    help="Where to keep looked up CIDs between runs",
+)
+@click.option("--no-cache", is_flag=True, help="Always ask PubChem")
+@click.option("--base-url", envvar="PUBCHEM_BASE_URL", default=PUBCHEM_URL)
+def pubchem_to_chebi(
+    pubchem_ids_file: str,
+    cache_file="pubchem-cache.sqlite",
+    no_cache=False,
+    base_url=PUBCHEM_URL,
+):
     pubchem_ids_file: Path = Path(pubchem_ids_file)
 
-    client = httpx.Client()
-
     lines = pubchem_ids_file.read_text(encoding="utf-8").splitlines()
-    for pc_id in lines:
-        if not re.fullmatch(r"\d+", pc_id):
-            continue
-        r = client.get(
-            f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{pc_id}/xrefs/SBURL/JSON"
-        )
-        resp = r.json()
-        chebi_id = get_chebi_id(resp)
-        print(pc_id, chebi_id)
+    cids = [pc_id for pc_id in lines if re.fullmatch(r"\d+", pc_id)]
 
+    cache = None if no_cache else ResponseCache(cache_file)
+    resolver = PubChemResolver(cache=cache, base_url=base_url)
+    chebi_ids = asyncio.run(resolver.resolve(cids))
+    for pc_id in cids:
+        print(pc_id, chebi_ids[pc_id])
 
-def load_chebi_database(file: Path):
-    db = []
-    with open(file, "r", encoding="utf-8") as fp:
-        for line in fp:
-            chebi_id, *names = line.split("\t")
-            db.append({"ID": chebi_id, "NAMES": names})
-    return db
+    if cache is not None:
+        logger.info("PubChem cache: %s", cache.stats())
+        cache.close()
 
 
 @cli.command()
@@ -62,31 +65,69 @@ def load_chebi_database(file: Path):
 @click.option("--measure", default="dice", show_default=True)
 @click.option("--top-k", default=3, type=int, show_default=True)
 @click.option("--id-only", is_flag=True)
+@click.option(
+    "--engine",
+    type=click.Choice(["index", "matrix", "brute"]),
+    default="index",
+    show_default=True,
+    help="Candidate search for the dice measure, jaro always scans every name."
+    " matrix needs the numpy and scipy of the optional matrix dependencies",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=int,
+    show_default=True,
+    help="Match names in this many processes",
+)
+@click.option(
+    "--exact-first",
+    is_flag=True,
+    help="Try exact, normalized and stereo-insensitive lookups before fuzzy"
+    " matching, and print which of them answered after each name",
+)
 def name_to_chebi(
-    metabolite_names_txt, chebi_database, measure="dice", top_k=3, id_only=False
+    metabolite_names_txt,
+    chebi_database,
+    measure="dice",
+    top_k=3,
+    id_only=False,
+    engine="index",
+    jobs=1,
+    exact_first=False,
 ):
     metabolite_names_txt = Path(metabolite_names_txt)
     chebi_database = Path(chebi_database)
+    if measure not in ("dice", "jaro"):
+        raise Exception("Invalid measure: " + measure)
+
+    db = open_chebi_database(chebi_database)
+    names = metabolite_names_txt.read_text(encoding="utf-8").splitlines()
+
+    answered = {}
+    if exact_first:
+        exact = ExactMatcher.from_database(db)
+        for idx, name in enumerate(names):
+            if (answer := exact.lookup(name, MAX_CANDIDATES)) is not None:
+                answered[idx] = answer
+        logger.info(
+            "Found %d of %d names without fuzzy matching", len(answered), len(names)
+        )
+
+    misses = [name for idx, name in enumerate(names) if idx not in answered]
+    fuzzy_candidates = iter(())
+    if misses:
+        fuzzy_candidates = match_in_parallel(
+            build_fuzzy_matcher(db, measure, engine), misses, jobs
+        )
+
+    for idx, name in enumerate(names):
+        tier, candidates = answered.get(idx) or ("fuzzy", next(fuzzy_candidates))
+        prefix = f"{name}\t{tier}" if exact_first else name
 
-    db = load_chebi_database(chebi_database)
-    for name in metabolite_names_txt.read_text(encoding="utf-8").splitlines():
-        heap = []
-        for entry in db:
-            for entry_name in entry["NAMES"]:
-                entry_name = entry_name.strip()
-                if measure == "dice":
-                    dist = dice(name, entry_name)
-                elif measure == "jaro":
-                    dist = jaro.jaro_winkler_metric(name.lower(), entry_name.lower())
-                else:
-                    raise Exception("Invalid measure: " + measure)
-                heapq.heappush(heap, (dist, entry_name, entry["ID"]))
-                if len(heap) > 10:
-                    heapq.heappop(heap)
-
-        candidates = [heapq.heappop(heap) for _ in range(len(heap))][::-1]
         if len(candidates) == 0:
-            print(f"{name}\t-")
+            print(f"{prefix}\t-")
             continue
         else:
             if id_only:
@@ -99,7 +140,25 @@ def name_to_chebi(
                     for score, chebi_name, chebi_id in candidates[:top_k]
                 )
 
-        print(f"{name}\t{top_k_str}")
+        print(f"{prefix}\t{top_k_str}")
+
+
+def build_fuzzy_matcher(db, measure: str, engine: str):
+    if measure == "dice" and engine == "matrix":
+        try:
+            matrix = ChebiMatrix.from_database(db)
+        except ImportError as e:
+            raise click.UsageError(str(e))
+        logger.info("Built the bigram matrix for %d ChEBI names", len(matrix))
+        return lambda batch: matrix.match_many(batch, MAX_CANDIDATES)
+    elif measure == "dice" and engine == "index":
+        index = ChebiIndex.from_database(db)
+        logger.info("Indexed %d ChEBI names", len(index))
+        return lambda batch: [index.match(name, MAX_CANDIDATES) for name in batch]
+    else:
+        return lambda batch: [
+            match_brute_force(name, db, measure, MAX_CANDIDATES) for name in batch
+        ]
 
 
 @cli.command()
@@ -149,4 +208,6 @@ def extract_refmet_chebi_ids(refmet_output_txt, just_ids=False):
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
     cli()
@@ -6,12 +6,12 @@ from pathlib import Path
 
 import dotenv
 import tomllib
-from langchain_openai import ChatOpenAI
 
 sys.path.append(str(Path(__file__).parent / ".."))
 
-from viime_extract.extract import extract_article_from_document_loader
+from viime_extract.extract import extract_article_from_config
 from viime_extract.config import Config
+from viime_extract.llm import configure, get_response_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = getLogger(Path(__file__).name)
@@ -58,18 +58,17 @@ def main(args: ProgArgs):
     with open(args.config, "rb") as fp:
         config = Config.model_validate(tomllib.load(fp))
 
+    configure(config)
     logger.info('Extracting structured information from "%s"', args.pdf_file)
 
-    model = ChatOpenAI(model=config.model_name, temperature=config.temperature)
-    article = extract_article_from_document_loader(
-        doc_loader=config.pdf_loader.create_loader(args.pdf_file),
+    model = config.create_model()
+    article = extract_article_from_config(
+        config,
         model=model,
-        splitter=config.text_splitter.create_splitter(),
-        detect_references_prompt=config.prompts.detect_references,
-        article_metadata_prompt=config.prompts.article_metadata,
-        article_keywords_prompt=config.prompts.article_keywords,
-        without_references=config.extractor.without_references,
+        doc_loader=config.pdf_loader.create_loader(args.pdf_file),
     )
+    if (cache := get_response_cache()) is not None:
+        logger.info("LLM response cache: %s", cache.stats())
     article_json = article.model_dump_json(indent=2)
 
     if args.output:
@@ -0,0 +1,198 @@
+import asyncio
+import glob
+import logging
+import sys
+from argparse import ArgumentParser, Namespace
+from logging import getLogger
+from pathlib import Path
+
+import dotenv
+import tomllib
+from langchain_openai import ChatOpenAI
+
+sys.path.append(str(Path(__file__).parent / ".."))
+
+from viime_extract.extract import aextract_article_from_config
+from viime_extract.config import Config
+from viime_extract.llm import (
+    DEFAULT_CONCURRENCY_LIMIT,
+    configure,
+    get_response_cache,
+    set_concurrency_limit,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = getLogger(Path(__file__).name)
+
+
+class UserInputError(RuntimeError): ...
+
+
+class ProgArgs(Namespace):
+    inputs: list[str]
+    config: Path
+    output_dir: Path
+    concurrency: int
+    max_articles: int
+    skip_existing: bool
+
+
+def parse_args() -> ProgArgs:
+    parser = ArgumentParser(
+        description="Extract important information from many journal article PDFs."
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="PDF files, directories containing PDFs, or glob patterns",
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        type=Path,
+        help="The TOML config file to use",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        type=Path,
+        required=True,
+        help="Directory to write one <pdf name>.json result per article",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY_LIMIT,
+        help="Maximum number of in-flight LLM requests across all articles",
+    )
+    parser.add_argument(
+        "--max-articles",
+        type=int,
+        default=8,
+        help="Maximum number of articles loaded and processed at the same time",
+    )
+    parser.add_argument(
+        "--skip-existing",
+        action="store_true",
+        help="Skip PDFs that already have a result in the output directory",
+    )
+
+    return parser.parse_args()
+
+
+def collect_pdf_files(inputs: list[str]) -> list[Path]:
+    files: dict[Path, None] = {}
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_dir():
+            matches = sorted(path.glob("*.pdf"))
+        elif path.is_file():
+            matches = [path]
+        else:
+            matches = [Path(p) for p in sorted(glob.glob(entry)) if Path(p).is_file()]
+            if not matches:
+                raise UserInputError(f'"{entry}" does not match any files')
+        files.update((match, None) for match in matches)
+
+    # results are named after the PDF, so same-named PDFs would overwrite
+    # each other's result
+    by_name: dict[str, list[Path]] = {}
+    for file in files:
+        by_name.setdefault(file.name, []).append(file)
+    duplicates = [paths for paths in by_name.values() if len(paths) > 1]
+    if duplicates:
+        raise UserInputError(
+            "PDF files with the same name would write the same result: "
+            + "; ".join(
+                ", ".join(f'"{path}"' for path in paths) for paths in duplicates
+            )
+        )
+    return list(files)
+
+
+def output_path(output_dir: Path, pdf_file: Path) -> Path:
+    return output_dir / f"{pdf_file.name}.json"
+
+
+async def extract_pdf(
+    pdf_file: Path,
+    output_file: Path,
+    config: Config,
+    model: ChatOpenAI,
+    article_slots: asyncio.Semaphore,
+) -> bool:
+    async with article_slots:
+        logger.info('Extracting structured information from "%s"', pdf_file)
+        try:
+            article = await aextract_article_from_config(
+                config,
+                model=model,
+                doc_loader=config.pdf_loader.create_loader(pdf_file),
+            )
+        except Exception:
+            logger.exception('Extraction failed for "%s"', pdf_file)
+            return False
+
+    with open(output_file, "w", encoding="utf-8") as fp:
+        fp.write(article.model_dump_json(indent=2))
+    logger.info('Wrote "%s"', output_file)
+    return True
+
+
+async def run(
+    pdf_files: list[Path], config: Config, output_dir: Path, max_articles: int
+) -> int:
+    model = config.create_model()
+    article_slots = asyncio.Semaphore(max_articles)
+
+    results = await asyncio.gather(
+        *(
+            extract_pdf(
+                pdf_file,
+                output_path(output_dir, pdf_file),
+                config,
+                model,
+                article_slots,
+            )
+            for pdf_file in pdf_files
+        )
+    )
+    return results.count(False)
+
+
+def main(args: ProgArgs):
+    if not args.config:
+        raise UserInputError("Config file is required")
+    if args.concurrency < 1 or args.max_articles < 1:
+        raise UserInputError("--concurrency and --max-articles must be at least 1")
+
+    pdf_files = collect_pdf_files(args.inputs)
+    if args.skip_existing:
+        pdf_files = [
+            f for f in pdf_files if not output_path(args.output_dir, f).exists()
+        ]
+
+    with open(args.config, "rb") as fp:
+        config = Config.model_validate(tomllib.load(fp))
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    configure(config)
+    set_concurrency_limit(args.concurrency)
+
+    logger.info("Extracting %d PDF files", len(pdf_files))
+    failures = asyncio.run(run(pdf_files, config, args.output_dir, args.max_articles))
+    if (cache := get_response_cache()) is not None:
+        logger.info("LLM response cache: %s", cache.stats())
+    if failures:
+        logger.error("%d of %d PDF files failed", failures, len(pdf_files))
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+
+    try:
+        main(parse_args())
+    except UserInputError as exc:
+        print("Usage error:", " ".join(exc.args), file=sys.stderr)
+        sys.exit(1)
@@ -8,14 +8,14 @@ from typing import Iterator
 
 import dotenv
 import tomllib
-from langchain_openai import ChatOpenAI
 from langchain_core.document_loaders.base import BaseLoader
 from langchain_core.documents.base import Document
 
 sys.path.append(str(Path(__file__).parent / ".."))
 
-from viime_extract.extract import extract_article_from_document_loader
+from viime_extract.extract import extract_article_from_config
 from viime_extract.config import Config
+from viime_extract.llm import configure, get_response_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = getLogger(Path(__file__).name)
@@ -119,18 +119,17 @@ def main(args: ProgArgs):
     else:
         config = Config()
 
+    configure(config)
     logger.info('Extracting structured information from "%s"', args.file)
 
-    model = ChatOpenAI(model=config.model_name, temperature=config.temperature)
-    article = extract_article_from_document_loader(
-        doc_loader=TextFileDocumentLoader(args.file),
+    model = config.create_model()
+    article = extract_article_from_config(
+        config,
         model=model,
-        splitter=config.text_splitter.create_splitter(),
-        detect_references_prompt=config.prompts.detect_references,
-        article_metadata_prompt=config.prompts.article_metadata,
-        article_keywords_prompt=config.prompts.article_keywords,
-        without_references=config.extractor.without_references,
+        doc_loader=TextFileDocumentLoader(args.file),
     )
+    if (cache := get_response_cache()) is not None:
+        logger.info("LLM response cache: %s", cache.stats())
     article_json = article.model_dump_json(indent=2)
 
     if args.output:
@@ -1,27 +1,300 @@
 import click
 import io
 import csv
+import gzip
+import hashlib
+import heapq
+import pickle
+import sys
+import tempfile
+from collections import Counter
+from itertools import groupby, islice
+from pathlib import Path
 
+sys.path.append(str(Path(__file__).parent / ".."))
 
-@click.command()
-@click.argument("compounds_tsv")
-@click.argument("names_tsv")
-def merge_db(compounds_tsv, names_tsv):
+from viime_extract.chebi import is_current_binary_database, write_binary_database
+
+# records per pickled block in a sorted run
+RUN_BLOCK_SIZE = 4096
+# compound lines per write in the TSV output
+OUTPUT_BATCH_SIZE = 4096
+
+
+def open_tsv(path: str):
+    """Opens a ChEBI flat file, reading `.gz` downloads without unpacking them."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="latin-1")
+    return open(path, "r", encoding="latin-1")
+
+
+def merge_in_memory(compounds_tsv: str, names_tsv: str):
     db = {}
-    with open(compounds_tsv, "r", encoding="latin-1") as fp:
+    with open_tsv(compounds_tsv) as fp:
         reader = csv.DictReader(fp, delimiter="\t")
         for row in reader:
             if row["NAME"] == "null":
                 continue
             db[int(row["ID"])] = [row["NAME"]]
 
-    with open(names_tsv, "r", encoding="latin-1") as fp:
+    with open_tsv(names_tsv) as fp:
         reader = csv.DictReader(fp, delimiter="\t")
         for row in reader:
             db[int(row["COMPOUND_ID"])].append(row["NAME"])
 
-    for key, names in db.items():
-        print(f'{key}\t{"\t".join(names)}')
+    return db.items()
+
+
+def _write_run(records: list[tuple], tmp_dir: str | None):
+    fp = tempfile.TemporaryFile(dir=tmp_dir)
+    for start in range(0, len(records), RUN_BLOCK_SIZE):
+        pickle.dump(records[start : start + RUN_BLOCK_SIZE], fp)
+    fp.seek(0)
+    return fp
+
+
+def _read_run(fp):
+    with fp:
+        while True:
+            try:
+                yield from pickle.load(fp)
+            except EOFError:
+                return
+
+
+def external_sort(records, run_size: int, tmp_dir: str | None = None):
+    """Sorts `records` holding at most `run_size` of them in memory at once."""
+    runs = []
+    while chunk := list(islice(records, run_size)):
+        chunk.sort()
+        if not runs and len(chunk) < run_size:
+            # everything fit into a single run
+            yield from chunk
+            return
+        runs.append(_write_run(chunk, tmp_dir))
+    yield from heapq.merge(*(_read_run(fp) for fp in runs))
+
+
+def merge_streaming(
+    compounds_tsv: str, names_tsv: str, run_size: int, tmp_dir: str | None = None
+):
+    """Merge-joins both tables after sorting them by compound ID on disk.
+
+    Compounds come out in ascending ID order, which is the order of the
+    in-memory merge for ChEBI's own ID-sorted `compounds.tsv`. Names of
+    compounds that were skipped or don't exist are dropped and counted.
+    """
+
+    def read(path: str, id_column: str):
+        with open_tsv(path) as fp:
+            for seq, row in enumerate(csv.DictReader(fp, delimiter="\t")):
+                yield int(row[id_column]), seq, row["NAME"]
+
+    compounds = external_sort(
+        (row for row in read(compounds_tsv, "ID") if row[2] != "null"),
+        run_size,
+        tmp_dir,
+    )
+    names = external_sort(read(names_tsv, "COMPOUND_ID"), run_size, tmp_dir)
+
+    dropped = 0
+    name = next(names, None)
+    for compound_id, rows in groupby(compounds, key=lambda row: row[0]):
+        # a compound listed twice keeps its last name, like the dict does
+        *_, (_, _, compound_name) = rows
+        while name is not None and name[0] < compound_id:
+            dropped += 1
+            name = next(names, None)
+        merged = [compound_name]
+        while name is not None and name[0] == compound_id:
+            merged.append(name[2])
+            name = next(names, None)
+        yield compound_id, merged
+
+    while name is not None:
+        dropped += 1
+        name = next(names, None)
+    if dropped:
+        click.echo(f"Dropped {dropped} names of unknown compounds", err=True)
+
+
+def write_tsv(compounds, out):
+    batch = []
+    for key, names in compounds:
+        batch.append(f'{key}\t{"\t".join(names)}\n')
+        if len(batch) == OUTPUT_BATCH_SIZE:
+            out.write("".join(batch))
+            batch.clear()
+    out.write("".join(batch))
+
+
+def compound_hash(names: list[str]) -> str:
+    return hashlib.blake2b("\t".join(names).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def hashes_path(db_tsv: Path) -> Path:
+    return db_tsv.with_name(db_tsv.name + ".hashes")
+
+
+def read_db_tsv(db_tsv: Path):
+    with open(db_tsv, "r", encoding="utf-8") as fp:
+        for line in fp:
+            key, *names = line.rstrip("\n").split("\t")
+            yield int(key), names
+
+
+def _db_stamp(db_tsv: Path) -> str:
+    stat = db_tsv.stat()
+    return f"# {stat.st_size} {stat.st_mtime_ns}"
+
+
+def read_hashes(db_tsv: Path) -> dict[int, str]:
+    """Reads the per-compound hashes of a database, hashing it if needed.
+
+    The sidecar starts with the size and modification time of the database
+    it was written for; when they don't match, e.g. after a crash between
+    replacing the database and its sidecar, the database is hashed again.
+    """
+    sidecar = hashes_path(db_tsv)
+    if sidecar.exists():
+        with open(sidecar, "r", encoding="utf-8") as fp:
+            if fp.readline().rstrip("\n") == _db_stamp(db_tsv):
+                hashes = {}
+                for line in fp:
+                    key, digest = line.rstrip("\n").split("\t")
+                    hashes[int(key)] = digest
+                return hashes
+    return {key: compound_hash(names) for key, names in read_db_tsv(db_tsv)}
+
+
+def write_hashes(db_tsv: Path, hashes: dict[int, str]):
+    sidecar = hashes_path(db_tsv)
+    tmp_path = sidecar.with_name(sidecar.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        fp.write(_db_stamp(db_tsv) + "\n")
+        fp.writelines(f"{key}\t{digest}\n" for key, digest in hashes.items())
+    tmp_path.replace(sidecar)
+
+
+def update_db(db_tsv: Path, compounds, changes_fp=None) -> Counter:
+    """Rebuilds `db_tsv` from `compounds` and reports the compounds that
+    were added, changed or removed since the previous build.
+
+    Changes are found by comparing per-compound content hashes with the
+    `.hashes` sidecar of the previous build. The whole release is still
+    merged and written, but when nothing changed the database is left
+    untouched, so tools that check its modification time skip their
+    rebuilds. `changes_fp` receives one line per changed compound.
+    """
+    old_hashes = read_hashes(db_tsv) if db_tsv.exists() else {}
+    new_hashes = {}
+    changes = Counter()
+
+    def record(status: str, key: int, names: list[str]):
+        changes[status] += 1
+        if changes_fp is not None:
+            changes_fp.write("\t".join([status, str(key), *names]) + "\n")
+
+    def track(compounds):
+        for key, names in compounds:
+            digest = new_hashes[key] = compound_hash(names)
+            old_digest = old_hashes.pop(key, None)
+            if old_digest is None:
+                record("added", key, names)
+            elif old_digest != digest:
+                record("changed", key, names)
+            yield key, names
+
+    tmp_path = db_tsv.with_name(db_tsv.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        write_tsv(track(compounds), out)
+    for key in old_hashes:
+        record("removed", key, [])
+
+    if changes or not db_tsv.exists():
+        tmp_path.replace(db_tsv)
+    else:
+        tmp_path.unlink()
+    # also replaces a sidecar left stale by a crash after the line above
+    write_hashes(db_tsv, new_hashes)
+    return changes
+
+
+@click.command()
+@click.argument("compounds_tsv")
+@click.argument("names_tsv")
+@click.option(
+    "-b",
+    "--binary-output",
+    help="Write the memory-mappable binary database here instead of TSV to stdout",
+)
+@click.option(
+    "--streaming",
+    is_flag=True,
+    help="Sort both tables on disk and merge them with bounded memory",
+)
+@click.option(
+    "--run-size",
+    default=500_000,
+    show_default=True,
+    help="Rows sorted in memory at once when streaming",
+)
+@click.option("--tmp-dir", help="Where to keep sorted runs when streaming")
+@click.option(
+    "-u",
+    "--update",
+    help="Rebuild this database, only replacing it if a compound changed,"
+    " and report the added, changed and removed compounds",
+)
+@click.option(
+    "--changes-output",
+    help="With --update, write the added, changed and removed compounds here",
+)
+def merge_db(
+    compounds_tsv,
+    names_tsv,
+    binary_output=None,
+    streaming=False,
+    run_size=500_000,
+    tmp_dir=None,
+    update=None,
+    changes_output=None,
+):
+    if streaming:
+        db = merge_streaming(compounds_tsv, names_tsv, run_size, tmp_dir)
+    else:
+        db = merge_in_memory(compounds_tsv, names_tsv)
+
+    if update:
+        db_tsv = Path(update)
+        changes_fp = (
+            open(changes_output, "w", encoding="utf-8") if changes_output else None
+        )
+        try:
+            changes = update_db(db_tsv, db, changes_fp)
+        finally:
+            if changes_fp is not None:
+                changes_fp.close()
+        click.echo(
+            f"{changes['added']} added, {changes['changed']} changed"
+            f" and {changes['removed']} removed compounds",
+            err=True,
+        )
+        if binary_output and (changes or not is_current_binary_database(binary_output)):
+            num_compounds, num_names = write_binary_database(
+                binary_output, read_db_tsv(db_tsv)
+            )
+            click.echo(
+                f"Wrote {num_compounds} compounds and {num_names} names", err=True
+            )
+        return
+
+    if binary_output:
+        num_compounds, num_names = write_binary_database(binary_output, db)
+        click.echo(f"Wrote {num_compounds} compounds and {num_names} names", err=True)
+        return
+
+    write_tsv(db, sys.stdout)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,13 @@
 import click
 import json
+import sys
 from pathlib import Path
 import csv
 
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from viime_extract.results import open_results
+
 
 @click.group()
 def cli(): ...
@@ -13,7 +18,7 @@ def cli(): ...
 @click.option("--results-json", "-r", type=click.Path(exists=True), required=True)
 @click.option("--output-csv", "-o", type=click.Path(), required=True)
 def as_csv(abstracts_csv: click.Path, results_json: click.Path, output_csv: click.Path):
-    results_json = json.loads(Path(results_json).read_bytes())
+    results_json = open_results(results_json)
     output = []
     with open(abstracts_csv, "r", encoding="utf-8") as fp:
         reader = csv.DictReader(fp)
@@ -90,7 +95,7 @@ def as_csv(abstracts_csv: click.Path, results_json: click.Path, output_csv: clic
 def as_layoutr(
     abstracts_csv: click.Path, results_json: click.Path, output_json: click.Path
 ):
-    results_json = json.loads(Path(results_json).read_bytes())
+    results_json = open_results(results_json)
     pmid_to_title = {}
     with open(abstracts_csv, "r", encoding="utf-8") as fp:
         reader = csv.DictReader(fp)
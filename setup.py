@@ -17,6 +17,9 @@ setup(
         "langchain-openai",
         "langchain-text-splitters",
     ],
+    extras_require={
+        "matrix": ["numpy", "scipy"],
+    },
     entry_points={
         "console_scripts": [
             # Add command line scripts here
@@ -0,0 +1,295 @@
+import importlib.util
+import json
+import tomllib
+import re
+import tempfile
+import threading
+import unittest
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+from click.testing import CliRunner
+from langchain_openai import ChatOpenAI
+
+from viime_extract.batch import build_chat_request
+from viime_extract.config import Config
+from viime_extract.schema import ArticleKeyWords
+
+ROOT = Path(__file__).parent / ".."
+
+CONFIG = """
+[prompts.article_metadata]
+system = "Extract the metadata."
+user = "{article_contents}"
+
+[prompts.article_keywords]
+system = "Extract the keywords."
+user = "{article_contents}"
+
+[prompts.detect_references]
+system = "Is this a references page?"
+user = "{article_contents}"
+
+[extractor]
+track_mentions = true
+"""
+
+
+def load_script(name: str):
+    spec = importlib.util.spec_from_file_location(name, ROOT / "bin" / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def answer(request: dict) -> dict:
+    """Answers a batch request like the model would, every capitalized word
+    of the chunk being a metabolite."""
+    body = request["body"]
+    schema = body["response_format"]["json_schema"]["name"]
+    if schema == "ArticleKeyWords":
+        text = body["messages"][-1]["content"]
+        output = {
+            "mentioned_metabolites": [
+                {"name": word} for word in re.findall(r"\b[A-Z]\w+", text)
+            ]
+        }
+    else:
+        output = {
+            "title": "Title",
+            "journal": "Journal",
+            "year": 2024,
+            "volume": "1",
+            "pubmed_id": None,
+            "doi_id": None,
+            "authors": [],
+        }
+    message = {"role": "assistant", "content": json.dumps(output)}
+    return {
+        "id": f"response-{request['custom_id']}",
+        "custom_id": request["custom_id"],
+        "response": {"status_code": 200, "body": {"choices": [{"message": message}]}},
+    }
+
+
+class BatchStub(BaseHTTPRequestHandler):
+    """The files and batches endpoints of the OpenAI API. A batch completes
+    on its second poll, with the answers of `answer`."""
+
+    files: dict[str, bytes]
+    batches: dict[str, dict]
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, body: bytes, content_type="application/json"):
+        self.send_response(200)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def reply_batch(self, batch: dict):
+        self.reply(
+            json.dumps({k: v for k, v in batch.items() if k != "polls"}).encode()
+        )
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["content-length"]))
+        if self.path.endswith("/files"):
+            message = BytesParser(policy=default_policy).parsebytes(
+                f"content-type: {self.headers['content-type']}\r\n\r\n".encode() + body
+            )
+            (upload,) = [
+                part
+                for part in message.iter_parts()
+                if part.get_param("name", header="content-disposition") == "file"
+            ]
+            file_id = f"file-{len(self.files)}"
+            self.files[file_id] = upload.get_payload(decode=True)
+            self.reply(
+                json.dumps(
+                    {
+                        "id": file_id,
+                        "object": "file",
+                        "bytes": len(self.files[file_id]),
+                        "created_at": 0,
+                        "filename": "input.jsonl",
+                        "purpose": "batch",
+                        "status": "processed",
+                    }
+                ).encode()
+            )
+        elif self.path.endswith("/batches"):
+            request = json.loads(body)
+            batch = {
+                "id": f"batch-{len(self.batches)}",
+                "object": "batch",
+                "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"],
+                "completion_window": request["completion_window"],
+                "status": "in_progress",
+                "created_at": 0,
+                "output_file_id": None,
+                "error_file_id": None,
+                "polls": 0,
+            }
+            self.batches[batch["id"]] = batch
+            self.reply_batch(batch)
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        if match := re.search(r"/batches/([^/]+)$", self.path):
+            batch = self.batches[match.group(1)]
+            batch["polls"] += 1
+            if batch["polls"] >= 2 and batch["status"] != "completed":
+                requests = self.files[batch["input_file_id"]].decode().splitlines()
+                output_id = f"file-{len(self.files)}"
+                self.files[output_id] = "\n".join(
+                    json.dumps(answer(json.loads(line))) for line in requests
+                ).encode()
+                batch.update(status="completed", output_file_id=output_id)
+            self.reply_batch(batch)
+        elif match := re.search(r"/files/([^/]+)/content$", self.path):
+            self.reply(self.files[match.group(1)], "application/octet-stream")
+        else:
+            self.send_error(404)
+
+
+class BuildChatRequestTest(unittest.TestCase):
+    def test_matches_the_interactive_request(self):
+        sent = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            sent.append(json.loads(request.content))
+            return httpx.Response(
+                200,
+                json=answer({"custom_id": "0", "body": sent[-1]})["response"]["body"]
+                | {"id": "0", "object": "chat.completion", "created": 0, "model": ""},
+            )
+
+        config = Config.model_validate(tomllib.loads(CONFIG))
+        prompt = config.prompts.article_keywords
+        model = ChatOpenAI(
+            model=config.model_name,
+            temperature=config.temperature,
+            api_key="test",
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        )
+        text = "Glucose was raised."
+        model.with_structured_output(ArticleKeyWords).invoke(
+            prompt.get_template().invoke({"article_contents": text})
+        )
+
+        body = build_chat_request(
+            config.model_name, config.temperature, prompt, ArticleKeyWords, text
+        )
+        self.assertEqual(body, {k: v for k, v in sent[0].items() if k != "stream"})
+
+
+class BatchExtractionTest(unittest.TestCase):
+    def setUp(self):
+        handler = type("Handler", (BatchStub,), {"files": {}, "batches": {}})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        self.handler = handler
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp = Path(self.tmp_dir.name)
+        (self.tmp / "config.toml").write_text(CONFIG, encoding="utf-8")
+        (self.tmp / "abstracts.csv").write_text(
+            "PMID,Abstract\n"
+            '1,"Glucose and Lactate were raised. Glucose fell later."\n'
+            '2,"Pyruvate was unchanged."\n',
+            encoding="utf-8",
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def invoke(self, *args: str):
+        script = load_script("batch_extract_abstracts")
+        result = CliRunner().invoke(
+            script.cli,
+            ["--base-url", self.base_url, *args],
+            env={"OPENAI_API_KEY": "test"},
+            catch_exceptions=False,
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+
+    def test_prepare_submit_wait_collect(self):
+        state = str(self.tmp / "state.json")
+        output = self.tmp / "results.json"
+        metadata = self.tmp / "metadata.json"
+
+        self.invoke(
+            "prepare",
+            str(self.tmp / "abstracts.csv"),
+            "-c",
+            str(self.tmp / "config.toml"),
+            "-s",
+            state,
+            "--with-metadata",
+            "--chunk-size",
+            "32",
+        )
+        self.invoke("submit", "-s", state)
+        self.invoke("wait", "-s", state, "--poll-interval", "0")
+        self.invoke(
+            "collect",
+            "-s",
+            state,
+            "-o",
+            str(output),
+            "--metadata-output-file",
+            str(metadata),
+        )
+
+        self.assertEqual(len(self.handler.batches), 1)
+        results = json.loads(output.read_text(encoding="utf-8"))
+        self.assertEqual(
+            results["1"]["mentioned_metabolites"],
+            [
+                {"name": "Glucose", "mentions": 2, "chunks": [0, 1]},
+                {"name": "Lactate", "mentions": 1, "chunks": [0]},
+            ],
+        )
+        self.assertEqual(
+            results["2"]["mentioned_metabolites"],
+            [{"name": "Pyruvate", "mentions": 1, "chunks": [0]}],
+        )
+        self.assertEqual(
+            json.loads(metadata.read_text(encoding="utf-8"))["2"]["title"], "Title"
+        )
+
+    def test_run_resumes_from_the_state_file(self):
+        args = [
+            "run",
+            str(self.tmp / "abstracts.csv"),
+            "-c",
+            str(self.tmp / "config.toml"),
+            "-s",
+            str(self.tmp / "state.json"),
+            "-o",
+            str(self.tmp / "results.json"),
+            "--poll-interval",
+            "0",
+        ]
+        self.invoke(*args)
+        self.invoke(*args)
+
+        # the second run found every batch finished and created none
+        self.assertEqual(len(self.handler.batches), 1)
+        results = json.loads((self.tmp / "results.json").read_text(encoding="utf-8"))
+        self.assertEqual(sorted(results), ["1", "2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from viime_extract.cache import ResponseCache
+from viime_extract.pubchem import PubChemResolver
+
+# the cross-references PubChem knows of, by CID
+SBURLS = {
+    "1": [
+        "https://example.org/x",
+        "https://www.ebi.ac.uk/chebi/searchId.do?chebiId=CHEBI:15903",
+    ],
+    "2": ["https://example.org/no-chebi"],
+    "3": ["https://www.ebi.ac.uk/chebi/searchId.do?chebiId=CHEBI:422"],
+}
+
+
+class PubChemStub(BaseHTTPRequestHandler):
+    """The PUG-REST SBURL cross-reference lookup. The first request for
+    CIDs 1 to 3 fails with a 503, and batches without any known CID get a
+    404 like they do from PubChem."""
+
+    requests: list[list[str]]
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cids = self.path.split("/")[3].split(",")
+        self.requests.append(cids)
+        if cids == ["1", "2", "3"] and self.requests.count(cids) == 1:
+            self.send_error(503)
+            return
+
+        information = [
+            {"CID": int(cid), "SBURL": SBURLS[cid]} for cid in cids if cid in SBURLS
+        ]
+        if not information:
+            self.send_error(404)
+            return
+        body = json.dumps({"InformationList": {"Information": information}}).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PubChemResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = type("Handler", (PubChemStub,), {"requests": []})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = Path(self.tmp_dir.name) / "pubchem.sqlite"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def resolve(self, cids: list[str]) -> dict[str, str | None]:
+        cache = ResponseCache(self.cache_path)
+        try:
+            resolver = PubChemResolver(
+                cache=cache,
+                base_url=f"http://127.0.0.1:{self.server.server_port}",
+                requests_per_second=1000,
+                batch_size=3,
+                max_backoff=0.01,
+            )
+            return asyncio.run(resolver.resolve(cids))
+        finally:
+            cache.close()
+
+    def test_batches_retries_and_caches(self):
+        cids = ["1", "2", "3", "4", "5", "1"]
+        expected = {"1": "15903", "2": None, "3": "422", "4": None, "5": None}
+
+        self.assertEqual(self.resolve(cids), expected)
+        # one batch retried after the 503, one answered 404
+        self.assertEqual(
+            sorted(self.handler.requests),
+            [["1", "2", "3"], ["1", "2", "3"], ["4", "5"]],
+        )
+
+        self.handler.requests.clear()
+        self.assertEqual(self.resolve(cids), expected)
+        # CIDs without a ChEBI ID are cached too
+        self.assertEqual(self.handler.requests, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,281 @@
+import json
+import time
+from logging import getLogger
+from pathlib import Path
+from typing import Iterable, Literal, Optional
+
+from langchain_core.documents.base import Document
+from langchain_text_splitters.base import TextSplitter
+from openai import OpenAI
+from openai.lib._parsing._completions import type_to_response_format_param
+from pydantic import BaseModel, Field
+
+from viime_extract.config import Config, Prompt
+from viime_extract.schema import (
+    ArticleKeyWords,
+    ArticleKeyWordsAccumulator,
+    ArticleMeta,
+)
+
+logging = getLogger(__name__)
+
+# limits of the OpenAI Batch API for a single input file
+MAX_REQUESTS_PER_BATCH = 50_000
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+class BatchRequestInfo(BaseModel):
+    document_id: str
+    kind: Literal["metadata", "keywords"]
+    chunk: int = 0
+
+
+class BatchPart(BaseModel):
+    input_path: str
+    input_file_id: Optional[str] = None
+    batch_id: Optional[str] = None
+    status: Optional[str] = None
+    output_file_id: Optional[str] = None
+    error_file_id: Optional[str] = None
+
+
+class BatchJob(BaseModel):
+    """Resumable state of an offline batch extraction.
+
+    The state is saved after every step that talks to the API, so that an
+    interrupted run can pick up from the last uploaded file or created batch.
+    """
+
+    state_path: str
+    parts: list[BatchPart] = Field(default_factory=list)
+    requests: dict[str, BatchRequestInfo] = Field(default_factory=dict)
+    # copied from the config, which the later steps don't load
+    track_mentions: bool = False
+
+    @classmethod
+    def load(cls, state_path: Path | str) -> "BatchJob":
+        return cls.model_validate_json(Path(state_path).read_text(encoding="utf-8"))
+
+    def save(self):
+        path = Path(self.state_path)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(self.model_dump_json(indent=2), encoding="utf-8")
+        tmp_path.replace(path)
+
+    @property
+    def done(self) -> bool:
+        return bool(self.parts) and all(
+            part.status in TERMINAL_STATUSES for part in self.parts
+        )
+
+
+def build_chat_request(
+    model_name: str,
+    temperature: float,
+    prompt: Prompt,
+    schema: type[BaseModel],
+    text: str,
+) -> dict:
+    """Renders a prompt into a chat completions body forcing `schema` as output.
+
+    `with_structured_output` of langchain-openai defaults to the json_schema
+    method, which has the OpenAI client send `schema` as a strict
+    `response_format`. The same conversion is used here, so batch requests
+    match the interactive ones and results validate with the same schemas.
+    """
+    messages = prompt.get_template().invoke({"article_contents": text}).to_messages()
+    return {
+        "model": model_name,
+        "temperature": temperature,
+        "messages": [
+            {"role": _ROLES[message.type], "content": message.content}
+            for message in messages
+        ],
+        "response_format": type_to_response_format_param(schema),
+    }
+
+
+def prepare_batch_job(
+    documents: Iterable[tuple[str, str]],
+    config: Config,
+    splitter: TextSplitter,
+    state_path: Path | str,
+    with_metadata=False,
+    max_requests_per_batch: int = MAX_REQUESTS_PER_BATCH,
+) -> BatchJob:
+    """Writes the JSONL input files for `(document_id, text)` pairs.
+
+    One keywords request is made per text chunk, plus one metadata request
+    per document when `with_metadata` is set, matching the requests that
+    the interactive pipeline would make.
+    """
+    state_path = Path(state_path)
+    job = BatchJob(
+        state_path=str(state_path), track_mentions=config.extractor.track_mentions
+    )
+    input_fp = None
+    written = 0
+
+    def write_request(custom_id: str, info: BatchRequestInfo, body: dict):
+        nonlocal input_fp, written
+        if custom_id in job.requests:
+            return
+        if input_fp is None or written % max_requests_per_batch == 0:
+            if input_fp is not None:
+                input_fp.close()
+            input_path = state_path.with_name(
+                f"{state_path.stem}.input-{len(job.parts)}.jsonl"
+            )
+            job.parts.append(BatchPart(input_path=str(input_path)))
+            input_fp = open(input_path, "w", encoding="utf-8")
+
+        line = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": body,
+        }
+        input_fp.write(json.dumps(line, ensure_ascii=False) + "\n")
+        job.requests[custom_id] = info
+        written += 1
+
+    try:
+        for document_id, text in documents:
+            if with_metadata:
+                write_request(
+                    f"{document_id}:metadata",
+                    BatchRequestInfo(document_id=document_id, kind="metadata"),
+                    build_chat_request(
+                        config.model_name,
+                        config.temperature,
+                        config.prompts.article_metadata,
+                        ArticleMeta,
+                        text,
+                    ),
+                )
+            chunks = splitter.split_documents([Document(text)])
+            for idx, chunk in enumerate(chunks):
+                write_request(
+                    f"{document_id}:keywords:{idx}",
+                    BatchRequestInfo(
+                        document_id=document_id, kind="keywords", chunk=idx
+                    ),
+                    build_chat_request(
+                        config.model_name,
+                        config.temperature,
+                        config.prompts.article_keywords,
+                        ArticleKeyWords,
+                        chunk.page_content,
+                    ),
+                )
+    finally:
+        if input_fp is not None:
+            input_fp.close()
+
+    job.save()
+    return job
+
+
+def submit_batch_job(job: BatchJob, client: OpenAI):
+    """Uploads input files and creates batches for parts that lack them."""
+    for part in job.parts:
+        if part.input_file_id is None:
+            with open(part.input_path, "rb") as fp:
+                part.input_file_id = client.files.create(file=fp, purpose="batch").id
+            job.save()
+            logging.info("Uploaded %s as %s", part.input_path, part.input_file_id)
+        if part.batch_id is None:
+            batch = client.batches.create(
+                input_file_id=part.input_file_id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+            )
+            part.batch_id = batch.id
+            part.status = batch.status
+            job.save()
+            logging.info("Created batch %s", part.batch_id)
+
+
+def refresh_batch_job(job: BatchJob, client: OpenAI):
+    for part in job.parts:
+        if part.batch_id is None or part.status in TERMINAL_STATUSES:
+            continue
+        batch = client.batches.retrieve(part.batch_id)
+        part.status = batch.status
+        part.output_file_id = batch.output_file_id
+        part.error_file_id = batch.error_file_id
+    job.save()
+
+
+def wait_for_batch_job(job: BatchJob, client: OpenAI, poll_interval: float = 60):
+    while True:
+        refresh_batch_job(job, client)
+        if job.done:
+            return
+        logging.info(
+            "Batch statuses: %s", ", ".join(str(part.status) for part in job.parts)
+        )
+        time.sleep(poll_interval)
+
+
+def _parse_response(line: dict, schema: type[BaseModel]) -> BaseModel | None:
+    response = line.get("response") or {}
+    if response.get("status_code") != 200:
+        return None
+    message = response["body"]["choices"][0]["message"]
+    # a refusal comes without content
+    if not message.get("content"):
+        return None
+    return schema.model_validate_json(message["content"])
+
+
+class BatchDocumentResult(BaseModel):
+    meta: Optional[ArticleMeta] = None
+    keywords: ArticleKeyWords = Field(default_factory=ArticleKeyWords)
+    failed_requests: list[str] = Field(default_factory=list)
+
+
+def collect_batch_results(
+    job: BatchJob, client: OpenAI
+) -> dict[str, BatchDocumentResult]:
+    """Maps batch outputs back to per-document metadata and keywords."""
+    responses: dict[str, dict] = {}
+    for part in job.parts:
+        if part.output_file_id is None:
+            continue
+        content = client.files.content(part.output_file_id).text
+        for raw_line in content.splitlines():
+            if raw_line.strip():
+                line = json.loads(raw_line)
+                responses[line["custom_id"]] = line
+
+    results: dict[str, BatchDocumentResult] = {}
+    keywords: dict[str, ArticleKeyWordsAccumulator] = {}
+    # requests are kept in submission order, so chunks merge in document order
+    for custom_id, info in job.requests.items():
+        result = results.setdefault(info.document_id, BatchDocumentResult())
+        schema = ArticleMeta if info.kind == "metadata" else ArticleKeyWords
+        try:
+            response = (
+                _parse_response(responses[custom_id], schema)
+                if custom_id in responses
+                else None
+            )
+        except ValueError:
+            logging.exception("Could not parse the response to %s", custom_id)
+            response = None
+
+        if response is None:
+            result.failed_requests.append(custom_id)
+        elif info.kind == "metadata":
+            result.meta = response
+        else:
+            keywords.setdefault(info.document_id, ArticleKeyWordsAccumulator()).add(
+                response, info.chunk if job.track_mentions else None
+            )
+
+    for document_id, accumulator in keywords.items():
+        results[document_id].keywords = accumulator.build()
+    return results
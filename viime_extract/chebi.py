@@ -0,0 +1,766 @@
+import gc
+import heapq
+import math
+import mmap
+import re
+import struct
+import sys
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from functools import cached_property, lru_cache
+from logging import getLogger
+from multiprocessing import get_all_start_methods, get_context
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Literal
+
+import jaro
+
+from viime_extract.schema import ArticleKeyWords
+
+logging = getLogger(__name__)
+
+Measure = Literal["dice", "jaro"]
+
+# name_to_chebi has always kept the best 10 candidates per query
+MAX_CANDIDATES = 10
+
+# (score, ChEBI name, ChEBI ID), ordered like the brute-force heap
+Match = tuple[float, str, str]
+Matcher = Callable[[list[str]], list[list[Match]]]
+Tier = Literal["exact", "normalized", "stereo", "fuzzy"]
+
+
+def bigrams(s: str):
+    return [s[i : i + 2] for i in range(len(s) - 1)]
+
+
+def dice(a: str, b: str):
+    a = set(bigrams(a.lower()))
+    b = set(bigrams(b.lower()))
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def load_chebi_database(file: Path):
+    db = []
+    with open(file, "r", encoding="utf-8") as fp:
+        for line in fp:
+            chebi_id, *names = line.split("\t")
+            db.append({"ID": chebi_id, "NAMES": names})
+    return db
+
+
+# the binary database is a header followed by 8-byte aligned sections, each
+# given by its offset and size in the header: compound IDs (i32), the
+# compound row of every name (i32), the bigram count of every lowercased name
+# (i32), the grams x names CSR matrix of the bigrams (row offsets and name
+# indexes, i32), then newline-joined UTF-8 tables of the names, their
+# normalized and stereo-stripped lookup keys and the bigrams
+BINARY_MAGIC = b"VXCHEBI2"
+_BINARY_PREFIX = BINARY_MAGIC[:-1]
+_ARRAY_SECTIONS = ("ids", "name_compound", "sizes", "gram_offsets", "postings")
+_TEXT_SECTIONS = ("names", "normalized_keys", "stereo_keys", "grams")
+_SECTIONS = _ARRAY_SECTIONS + _TEXT_SECTIONS
+_HEADER = struct.Struct(f"<8s3Q{2 * len(_SECTIONS)}Q")
+
+
+def _align(size: int) -> int:
+    return -size % 8
+
+
+def write_binary_database(
+    path: Path | str, compounds: Iterable[tuple[int, list[str]]]
+) -> tuple[int, int]:
+    """Writes `(ChEBI ID, names)` pairs in the memory-mappable format.
+
+    Names are stored stripped, as `load_chebi_database` users see them,
+    along with the bigram postings and lookup keys that the matchers would
+    otherwise build on every start. Returns the number of compounds and
+    names written.
+    """
+    ids, name_compound, sizes = array("i"), array("i"), array("i")
+    names, normalized_keys, stereo_keys = [], [], []
+    postings: dict[str, array] = {}
+    for row, (chebi_id, compound_names) in enumerate(compounds):
+        ids.append(chebi_id)
+        for name in compound_names:
+            name = name.strip()
+            idx = len(names)
+            names.append(name)
+            normalized_key, stereo_key = lookup_keys(name)
+            normalized_keys.append(normalized_key)
+            stereo_keys.append(stereo_key)
+            name_compound.append(row)
+            grams = set(bigrams(name.lower()))
+            sizes.append(len(grams))
+            for gram in grams:
+                if (posting := postings.get(gram)) is None:
+                    posting = postings[gram] = array("i")
+                posting.append(idx)
+
+    # sorted, as set order varies between runs and the file shouldn't
+    grams = sorted(postings)
+    gram_offsets, all_postings = array("i", [0]), array("i")
+    for gram in grams:
+        all_postings += postings[gram]
+        gram_offsets.append(len(all_postings))
+
+    sections = [ids, name_compound, sizes, gram_offsets, all_postings]
+    if sys.byteorder == "big":
+        for section in sections:
+            section.byteswap()
+    sections += [
+        "\n".join(table).encode("utf-8")
+        for table in (names, normalized_keys, stereo_keys, grams)
+    ]
+
+    layout, position = [], _HEADER.size
+    for section in sections:
+        position += _align(position)
+        size = len(section) * getattr(section, "itemsize", 1)
+        layout += [position, size]
+        position += size
+
+    with open(path, "wb") as fp:
+        fp.write(
+            _HEADER.pack(BINARY_MAGIC, len(ids), len(names), len(postings), *layout)
+        )
+        for section, offset in zip(sections, layout[::2]):
+            fp.write(b"\0" * (offset - fp.tell()))
+            fp.write(section)
+    return len(ids), len(names)
+
+
+class ChebiDatabase:
+    """A read-only, memory-mapped view of a binary ChEBI database.
+
+    The numeric sections are used in place, so processes that map the same
+    file share their pages. Each text table is decoded in one go the first
+    time it is used, and the matchers are built from the stored postings and
+    keys instead of from the names.
+    """
+
+    def __init__(self, path: Path | str):
+        if sys.byteorder == "big":
+            raise ValueError("Binary ChEBI databases are little-endian only")
+        with open(path, "rb") as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, num_compounds, num_names, num_grams, *layout = _HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != BINARY_MAGIC:
+            self._mmap.close()
+            if magic.startswith(_BINARY_PREFIX):
+                raise ValueError(
+                    f'"{path}" was written in an older format,'
+                    " rebuild it with chebi/merge_db.py -b"
+                )
+            raise ValueError(f'"{path}" is not a binary ChEBI database')
+
+        self.num_names = num_names
+        self.num_grams = num_grams
+        self._sections = dict(zip(_SECTIONS, zip(layout[::2], layout[1::2])))
+        view = memoryview(self._mmap)
+        self._views = {
+            name: view[offset : offset + size].cast("i")
+            for name, (offset, size) in self._sections.items()
+            if name in _ARRAY_SECTIONS
+        }
+        self.ids = self._views["ids"]
+        self.name_compound = self._views["name_compound"]
+        self.sizes = self._views["sizes"]
+        self.gram_offsets = self._views["gram_offsets"]
+        self.postings = self._views["postings"]
+
+    def __len__(self):
+        return self.num_names
+
+    def _text_table(self, section: str, length: int) -> list[str]:
+        if length == 0:
+            return []
+        offset, size = self._sections[section]
+        return self._mmap[offset : offset + size].decode("utf-8").split("\n")
+
+    @cached_property
+    def names(self) -> list[str]:
+        return self._text_table("names", self.num_names)
+
+    @cached_property
+    def chebi_ids(self) -> list[str]:
+        """The ChEBI ID of every name."""
+        compound_ids = [str(chebi_id) for chebi_id in self.ids]
+        return [compound_ids[row] for row in self.name_compound]
+
+    @cached_property
+    def normalized_keys(self) -> list[str]:
+        return self._text_table("normalized_keys", self.num_names)
+
+    @cached_property
+    def stereo_keys(self) -> list[str]:
+        return self._text_table("stereo_keys", self.num_names)
+
+    @cached_property
+    def grams(self) -> list[str]:
+        return self._text_table("grams", self.num_grams)
+
+    def iter_synonyms(self) -> Iterable[tuple[str, str, str]]:
+        return zip(self.names, self.chebi_ids, map(str.lower, self.names))
+
+    def close(self):
+        """Unmaps the file, once nothing built from the database is in use."""
+        for view in self._views.values():
+            view.release()
+        self._mmap.close()
+
+
+def is_current_binary_database(file: Path | str) -> bool:
+    """Whether `file` exists and is a binary database in the current format."""
+    try:
+        with open(file, "rb") as fp:
+            return fp.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def open_chebi_database(file: Path | str) -> "list[dict] | ChebiDatabase":
+    """Opens a binary database if `file` is one, else parses the TSV."""
+    with open(file, "rb") as fp:
+        is_binary = fp.read(len(_BINARY_PREFIX)) == _BINARY_PREFIX
+    return ChebiDatabase(file) if is_binary else load_chebi_database(Path(file))
+
+
+def iter_synonyms(
+    db: "list[dict] | ChebiDatabase",
+) -> Iterable[tuple[str, str, str]]:
+    """Yields `(name, ChEBI ID, lowercased name)` for every synonym in order."""
+    if isinstance(db, ChebiDatabase):
+        yield from db.iter_synonyms()
+        return
+    for entry in db:
+        for entry_name in entry["NAMES"]:
+            entry_name = entry_name.strip()
+            yield entry_name, entry["ID"], entry_name.lower()
+
+
+def score(measure: Measure, name: str, entry_name: str) -> float:
+    if measure == "dice":
+        return dice(name, entry_name)
+    elif measure == "jaro":
+        return jaro.jaro_winkler_metric(name.lower(), entry_name.lower())
+    else:
+        raise ValueError("Invalid measure: " + measure)
+
+
+def match_brute_force(
+    name: str,
+    db: "list[dict] | ChebiDatabase",
+    measure: Measure = "dice",
+    limit=MAX_CANDIDATES,
+) -> list[Match]:
+    """Scores `name` against every synonym, best matches first."""
+    heap = []
+    for entry_name, chebi_id, _ in iter_synonyms(db):
+        heapq.heappush(heap, (score(measure, name, entry_name), entry_name, chebi_id))
+        if len(heap) > limit:
+            heapq.heappop(heap)
+    return sorted(heap, reverse=True)
+
+
+class _SynonymTable:
+    """ChEBI synonyms and IDs in database order, with zero-score tie filling."""
+
+    def __init__(self):
+        self.names: list[str] = []
+        self.ids: list[str] = []
+        self._by_name_desc: list[int] | None = None
+
+    @classmethod
+    def from_database(cls, db: "list[dict] | ChebiDatabase"):
+        if isinstance(db, ChebiDatabase):
+            return cls._from_binary(db)
+        return cls(iter_synonyms(db))
+
+    @classmethod
+    def _from_binary(cls, db: ChebiDatabase):
+        """Builds the table from what the binary database stores for it."""
+        return cls(db.iter_synonyms())
+
+    @classmethod
+    def _empty(cls, db: ChebiDatabase):
+        table = cls.__new__(cls)
+        _SynonymTable.__init__(table)
+        table.names, table.ids = db.names, db.chebi_ids
+        return table
+
+    def __len__(self):
+        return len(self.names)
+
+    def _zero_fill(self, matched: set[int], limit: int) -> list[Match]:
+        # synonyms without a shared bigram score 0 and then tie on name and ID
+        if self._by_name_desc is None:
+            self._by_name_desc = sorted(
+                range(len(self.names)),
+                key=lambda idx: (self.names[idx], self.ids[idx]),
+                reverse=True,
+            )
+        fill = []
+        for idx in self._by_name_desc:
+            if len(fill) == limit:
+                break
+            if idx not in matched:
+                fill.append((0.0, self.names[idx], self.ids[idx]))
+        return fill
+
+
+class ChebiIndex(_SynonymTable):
+    """A bigram inverted index over the ChEBI synonyms for Dice matching.
+
+    Only synonyms that share a bigram with the query are counted, and they
+    are scored in order of their shared-bigram count until no remaining
+    candidate can beat the current top matches. The results, ties included,
+    are the same as `match_brute_force` with the dice measure.
+    """
+
+    def __init__(self, synonyms: Iterable[tuple[str, str, str]]):
+        super().__init__()
+        self.sizes = array("I")
+        postings: dict[str, array] = {}
+
+        for idx, (entry_name, chebi_id, normalized) in enumerate(synonyms):
+            grams = set(bigrams(normalized))
+            self.names.append(entry_name)
+            self.ids.append(chebi_id)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                if (posting := postings.get(gram)) is None:
+                    posting = postings[gram] = array("I")
+                posting.append(idx)
+
+        self.postings = postings
+
+    @classmethod
+    def _from_binary(cls, db: ChebiDatabase):
+        index = cls._empty(db)
+        index.sizes = db.sizes
+        offsets, postings = db.gram_offsets, db.postings
+        index.postings = {
+            gram: postings[offsets[row] : offsets[row + 1]]
+            for row, gram in enumerate(db.grams)
+        }
+        return index
+
+    def match(self, name: str, limit=MAX_CANDIDATES) -> list[Match]:
+        """Returns the `limit` best Dice matches for `name`, best first.
+
+        Unlike the brute-force scorer, a query without bigrams (shorter than
+        two characters) scores 0 against names without bigrams instead of
+        raising ZeroDivisionError.
+        """
+        grams = set(bigrams(name.lower()))
+        query_size = len(grams)
+        counts = Counter()
+        # rarest bigrams first keeps the counter small for as long as possible
+        for gram in sorted(grams, key=lambda g: len(self.postings.get(g, ()))):
+            if (posting := self.postings.get(gram)) is not None:
+                counts.update(posting)
+
+        heap: list[Match] = []
+        for idx, shared in counts.most_common():
+            if len(heap) == limit:
+                # a synonym sharing `shared` bigrams has at least that many
+                best_possible = 2 * shared / (query_size + shared)
+                if best_possible < heap[0][0]:
+                    break
+            match = (
+                2 * shared / (query_size + self.sizes[idx]),
+                self.names[idx],
+                self.ids[idx],
+            )
+            if len(heap) < limit:
+                heapq.heappush(heap, match)
+            elif match > heap[0]:
+                heapq.heapreplace(heap, match)
+
+        if len(heap) < limit:
+            heap.extend(self._zero_fill(set(counts), limit - len(heap)))
+        return sorted(heap, reverse=True)
+
+
+def _import_matrix_dependencies():
+    try:
+        import numpy as np
+        from scipy import sparse
+    except ImportError as e:
+        raise ImportError(
+            "The matrix engine needs numpy and scipy, install them with"
+            ' `uv sync --extra matrix` or `pip install "viime-extract[matrix]"`'
+        ) from e
+    return np, sparse
+
+
+class ChebiMatrix(_SynonymTable):
+    """Dice matching of query batches with sparse matrix products.
+
+    The synonyms' bigram sets are stored once as a binary CSR matrix, so the
+    shared-bigram counts for a batch of queries are a single product with
+    it. Results are the same as `match_brute_force` with the dice measure.
+    Needs numpy and scipy, from the optional `matrix` dependencies.
+    """
+
+    def __init__(self, synonyms: Iterable[tuple[str, str, str]], batch_size: int = 32):
+        np, sparse = _import_matrix_dependencies()
+        super().__init__()
+        self._np = np
+        self._sparse = sparse
+        self.batch_size = batch_size
+        self.vocabulary: dict[str, int] = {}
+
+        indptr = array("q", [0])
+        indices = array("i")
+        for entry_name, chebi_id, normalized in synonyms:
+            self.names.append(entry_name)
+            self.ids.append(chebi_id)
+            for gram in set(bigrams(normalized)):
+                indices.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+            indptr.append(len(indices))
+
+        indices = np.frombuffer(indices, dtype=np.int32)
+        matrix = sparse.csr_matrix(
+            (
+                np.ones(len(indices), dtype=np.int32),
+                indices,
+                np.frombuffer(indptr, dtype=np.int64),
+            ),
+            shape=(len(self.names), len(self.vocabulary)),
+        )
+        self.sizes = np.diff(matrix.indptr).astype(np.int64)
+        # grams x synonyms, so that queries @ matrix gives shared counts per row
+        self.matrix = matrix.T.tocsr()
+
+    @classmethod
+    def _from_binary(cls, db: ChebiDatabase, batch_size: int = 32):
+        np, sparse = _import_matrix_dependencies()
+        matrix = cls._empty(db)
+        matrix._np = np
+        matrix._sparse = sparse
+        matrix.batch_size = batch_size
+        matrix.vocabulary = {gram: row for row, gram in enumerate(db.grams)}
+        # the stored postings are this matrix in CSR form already
+        postings = np.frombuffer(db.postings, dtype=np.int32)
+        matrix.matrix = sparse.csr_matrix(
+            (
+                np.ones(len(postings), dtype=np.int32),
+                postings,
+                np.frombuffer(db.gram_offsets, dtype=np.int32),
+            ),
+            shape=(len(db.grams), len(db)),
+        )
+        matrix.sizes = np.frombuffer(db.sizes, dtype=np.int32)
+        return matrix
+
+    def _query_matrix(self, names: list[str]):
+        np = self._np
+        indptr, indices, sizes = [0], [], []
+        for name in names:
+            grams = set(bigrams(name.lower()))
+            sizes.append(len(grams))
+            # bigrams that no synonym has only count towards the query size
+            indices.extend(
+                self.vocabulary[gram] for gram in grams if gram in self.vocabulary
+            )
+            indptr.append(len(indices))
+        queries = self._sparse.csr_matrix(
+            (
+                np.ones(len(indices), dtype=np.int32),
+                np.array(indices, dtype=np.int32),
+                np.array(indptr),
+            ),
+            shape=(len(names), len(self.vocabulary)),
+        )
+        return queries, np.array(sizes, dtype=np.int64)
+
+    def _top(self, columns, counts, query_size: int, limit: int) -> list[Match]:
+        np = self._np
+        scores = 2.0 * counts / (query_size + self.sizes[columns])
+        if len(scores) > limit:
+            # keep every score tied with the limit-th best, names break ties
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            threshold = scores[best].min()
+            keep = np.flatnonzero(scores >= threshold)
+            columns, scores = columns[keep], scores[keep]
+        top = sorted(
+            (
+                (score, self.names[idx], self.ids[idx])
+                for score, idx in zip(scores.tolist(), columns.tolist())
+            ),
+            reverse=True,
+        )[:limit]
+        if len(top) < limit:
+            top.extend(self._zero_fill(set(columns.tolist()), limit - len(top)))
+        return top
+
+    def match_many(self, names: list[str], limit=MAX_CANDIDATES) -> list[list[Match]]:
+        """Returns the `limit` best Dice matches for each of `names`."""
+        results = []
+        for start in range(0, len(names), self.batch_size):
+            batch = names[start : start + self.batch_size]
+            queries, query_sizes = self._query_matrix(batch)
+            shared = (queries @ self.matrix).tocsr()
+            for row, query_size in enumerate(query_sizes.tolist()):
+                begin, end = shared.indptr[row], shared.indptr[row + 1]
+                results.append(
+                    self._top(
+                        shared.indices[begin:end],
+                        shared.data[begin:end],
+                        query_size,
+                        limit,
+                    )
+                )
+        return results
+
+    def match(self, name: str, limit=MAX_CANDIDATES) -> list[Match]:
+        return self.match_many([name], limit)[0]
+
+
+NON_ALNUM_RE = re.compile(r"[\W_]+")
+# leading descriptors such as D-, L-, DL-, (S)-, (2R,3S)-, (E)-, cis- and (+)-
+STEREO_PREFIX_RE = re.compile(
+    r"(?:\([\d,\s+\-±RSEZ]+\)|DL|D|L|cis|trans|meso)-+", re.IGNORECASE
+)
+
+
+NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+# maps the ASCII bytes that NON_ALNUM_RE matches to spaces
+_ASCII_SEPARATORS = bytes(c if chr(c).isalnum() else ord(" ") for c in range(256))
+
+
+@lru_cache(maxsize=None)
+def _spell_greek_char(ch: str) -> str:
+    name = unicodedata.name(ch, "")
+    if name.startswith("GREEK") and "LETTER" in name:
+        return " " + name.rsplit(" ", 1)[1].lower() + " "
+    return ch
+
+
+def _spell_greek(match: re.Match) -> str:
+    return _spell_greek_char(match.group())
+
+
+def normalize_name(name: str) -> str:
+    """Casefolds, spells out Greek letters and collapses punctuation to spaces.
+
+    "α-D-Glucose", "alpha-D-glucose" and "Alpha D glucose" all normalize to
+    "alpha d glucose".
+    """
+    # only non-ASCII characters can need NFKC or be Greek, and ASCII names
+    # take a faster path through bytes
+    if not name.isascii():
+        name = NON_ASCII_RE.sub(_spell_greek, unicodedata.normalize("NFKC", name))
+    name = name.casefold()
+    if name.isascii():
+        name = name.encode("ascii").translate(_ASCII_SEPARATORS)
+        return b" ".join(name.split()).decode("ascii")
+    return NON_ALNUM_RE.sub(" ", name).strip()
+
+
+def strip_stereo(name: str) -> str:
+    """Drops leading stereo descriptors, keeping at least some of the name."""
+    name = name.strip()
+    while (match := STEREO_PREFIX_RE.match(name)) and match.end() < len(name):
+        name = name[match.end() :]
+    return name
+
+
+def lookup_keys(name: str) -> tuple[str, str]:
+    """Returns the normalized and stereo-stripped lookup keys of `name`."""
+    normalized = normalize_name(name)
+    stripped = strip_stereo(name)
+    # most names have no stereo prefix, so both keys are the same
+    if stripped == name.strip():
+        return normalized, normalized
+    return normalized, normalize_name(stripped)
+
+
+class ExactMatcher(_SynonymTable):
+    """Hash lookups of exact, normalized and stereo-stripped synonyms.
+
+    Each tier is only consulted when the stricter one before it has no
+    match, and every synonym found by a tier is returned with score 1.
+    """
+
+    def __init__(self, synonyms: Iterable[tuple[str, str, str]]):
+        super().__init__()
+        normalized_keys, stereo_keys = [], []
+        for entry_name, chebi_id, _ in synonyms:
+            self.names.append(entry_name)
+            self.ids.append(chebi_id)
+            normalized_key, stereo_key = lookup_keys(entry_name)
+            normalized_keys.append(normalized_key)
+            stereo_keys.append(stereo_key)
+        self._index_tiers(normalized_keys, stereo_keys)
+
+    @classmethod
+    def _from_binary(cls, db: ChebiDatabase):
+        matcher = cls._empty(db)
+        matcher._index_tiers(db.normalized_keys, db.stereo_keys)
+        return matcher
+
+    def _index_tiers(self, normalized_keys: list[str], stereo_keys: list[str]):
+        self.tiers: dict[Tier, dict[str, list[int]]] = {}
+        for tier, keys in (
+            ("exact", self.names),
+            ("normalized", normalized_keys),
+            ("stereo", stereo_keys),
+        ):
+            index = self.tiers[tier] = {}
+            for idx, key in enumerate(keys):
+                if key:
+                    index.setdefault(key, []).append(idx)
+
+    def lookup(
+        self, name: str, limit: int | None = MAX_CANDIDATES
+    ) -> tuple[Tier, list[Match]] | None:
+        normalized, stereo = lookup_keys(name)
+        for tier, key in (
+            ("exact", name.strip()),
+            ("normalized", normalized),
+            ("stereo", stereo),
+        ):
+            if indexes := self.tiers[tier].get(key):
+                matches = {(1.0, self.names[idx], self.ids[idx]) for idx in indexes}
+                return tier, sorted(matches, reverse=True)[:limit]
+        return None
+
+
+# set just before forking the pool, so workers inherit the matcher and its
+# index instead of unpickling a copy per task
+_fork_matcher: Matcher | None = None
+
+
+def _match_shard(names: list[str]) -> list[list[Match]]:
+    return _fork_matcher(names)
+
+
+def match_in_parallel(
+    matcher: Matcher, names: list[str], jobs: int, shards_per_job: int = 4
+) -> Iterator[list[Match]]:
+    """Runs `matcher` over contiguous shards of `names` in `jobs` processes.
+
+    The workers are forked, so they share the parent's index pages rather
+    than receiving a pickled copy. Results are yielded in the order of
+    `names`. Without fork (e.g. on Windows) everything runs in-process.
+    """
+    global _fork_matcher
+
+    if jobs <= 1 or len(names) <= 1:
+        yield from matcher(names)
+        return
+    if "fork" not in get_all_start_methods():
+        logging.warning("Processes can't be forked here, matching in one process")
+        yield from matcher(names)
+        return
+
+    shard_size = math.ceil(len(names) / (jobs * shards_per_job))
+    shards = [names[i : i + shard_size] for i in range(0, len(names), shard_size)]
+    _fork_matcher = matcher
+    # keep the collector from touching (and so copying) the inherited objects
+    gc.freeze()
+    try:
+        with get_context("fork").Pool(jobs) as pool:
+            for results in pool.imap(_match_shard, shards):
+                yield from results
+    finally:
+        gc.unfreeze()
+        _fork_matcher = None
+
+
+class ChebiLinker:
+    """Links metabolite names to ChEBI IDs against a preloaded database.
+
+    Names are first looked up exactly (see `ExactMatcher`); the rest are
+    matched in one batch by the fuzzy Dice engine, which is only built when
+    first needed. The best match is used if it scores at least `min_score`.
+    A name that a lookup tier matches to several compounds is left unlinked
+    rather than guessed. Answers are memoized, so a name repeated across a
+    corpus is linked once.
+    """
+
+    def __init__(
+        self,
+        db: "list[dict] | ChebiDatabase",
+        engine: Literal["index", "matrix"] = "index",
+        min_score: float = 0.8,
+    ):
+        self.db = db
+        self.engine = engine
+        self.min_score = min_score
+        self.exact = ExactMatcher.from_database(db)
+        self._fuzzy: Matcher | None = None
+        self._linked: dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    def _fuzzy_matcher(self) -> Matcher:
+        if self._fuzzy is None:
+            if self.engine == "matrix":
+                matrix = ChebiMatrix.from_database(self.db)
+                self._fuzzy = lambda names: matrix.match_many(names, 1)
+            else:
+                index = ChebiIndex.from_database(self.db)
+                self._fuzzy = lambda names: [index.match(name, 1) for name in names]
+        return self._fuzzy
+
+    def link(self, names: Iterable[str]) -> list[str | None]:
+        names = list(names)
+        with self._lock:
+            misses = []
+            for name in dict.fromkeys(names):
+                if name in self._linked:
+                    continue
+                if (answer := self.exact.lookup(name, None)) is None:
+                    misses.append(name)
+                    continue
+                # a tier can match several compounds, e.g. "lactate" is both
+                # L- and D-lactate once stereo prefixes are stripped
+                chebi_ids = {chebi_id for _, _, chebi_id in answer[1]}
+                self._linked[name] = chebi_ids.pop() if len(chebi_ids) == 1 else None
+
+            if misses:
+                for name, matches in zip(misses, self._fuzzy_matcher()(misses)):
+                    best = matches[0] if matches else None
+                    self._linked[name] = (
+                        best[2] if best and best[0] >= self.min_score else None
+                    )
+            return [self._linked[name] for name in names]
+
+    def link_keywords(self, keywords: ArticleKeyWords) -> ArticleKeyWords:
+        """Sets `chebi_id` on every mentioned metabolite, in place."""
+        metabolites = keywords.mentioned_metabolites or []
+        for metabolite, chebi_id in zip(
+            metabolites, self.link(metabolite.name for metabolite in metabolites)
+        ):
+            metabolite.chebi_id = chebi_id
+        return keywords
+
+
+# one linker per database and settings, shared by every thread of the process
+_linkers: dict[tuple[str, str, float], ChebiLinker] = {}
+_linkers_lock = threading.Lock()
+
+
+def load_linker(
+    path: str, engine: Literal["index", "matrix"] = "index", min_score: float = 0.8
+) -> ChebiLinker:
+    """Returns a process-wide linker, so the database is loaded only once.
+
+    Concurrent first calls wait for the one that loads the database.
+    """
+    with _linkers_lock:
+        key = (path, engine, min_score)
+        if (linker := _linkers.get(key)) is None:
+            logging.info('Loading the ChEBI database "%s"', path)
+            linker = _linkers[key] = ChebiLinker(
+                open_chebi_database(path), engine=engine, min_score=min_score
+            )
+        return linker
@@ -1,10 +1,30 @@
+import importlib
+from functools import lru_cache
+from typing import TYPE_CHECKING, Literal
+
 import langchain_text_splitters
 from langchain_community import document_loaders
 from langchain_community.document_loaders.base import BaseLoader
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_text_splitters.base import TextSplitter
 from pydantic import BaseModel, Field, field_validator
-from langchain_docling import DoclingLoader
+
+from viime_extract.cache import ResponseCache
+from viime_extract.chebi import ChebiLinker, load_linker
+from viime_extract.ratelimit import RateLimiter
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+
+@lru_cache(maxsize=64)
+def _build_template(system: str, user: str) -> ChatPromptTemplate:
+    return ChatPromptTemplate(
+        [
+            ("system", system),
+            ("user", user),
+        ]
+    )
 
 
 class Prompt:
@@ -12,12 +32,9 @@ class Prompt:
     user: str
 
     def get_template(self):
-        return ChatPromptTemplate(
-            [
-                ("system", self.system),
-                ("user", self.user),
-            ]
-        )
+        # templates are immutable, so every chunk can share the one built
+        # for these messages instead of parsing them again
+        return _build_template(self.system, self.user)
 
 
 class ArticleMetadataPrompt(Prompt, BaseModel): ...
@@ -35,23 +52,31 @@ class PromptsConfig(BaseModel):
     detect_references: DetectReferencesPrompt
 
 
+# loaders that live outside of langchain_community, by the module providing
+# them; imported only when used, since docling pulls in its whole ML stack
+EXTRA_LOADERS = {"DoclingLoader": "langchain_docling"}
+
+
 class PDFLoaderConfig(BaseModel):
     class_name: str = "PyPDFLoader"
 
     @field_validator("class_name", mode="after")
     @classmethod
     def is_valid_loader(cls, name: str) -> str:
-        if not hasattr(document_loaders, name) and name not in ("DoclingLoader",):
+        # checked against the exported names, so that validating a config
+        # doesn't import the loader and its backend
+        if name not in document_loaders.__all__ and name not in EXTRA_LOADERS:
             raise ValueError(
                 f"{name} is not a valid langchain_community document loader"
             )
         return name
 
     def create_loader(self, *args, **kwargs) -> BaseLoader:
-        if not hasattr(document_loaders, self.class_name):
-            if self.class_name == "DoclingLoader":
-                return DoclingLoader(*args, **kwargs)
-        return getattr(document_loaders, self.class_name)(*args, **kwargs)
+        if self.class_name in EXTRA_LOADERS:
+            module = importlib.import_module(EXTRA_LOADERS[self.class_name])
+        else:
+            module = document_loaders
+        return getattr(module, self.class_name)(*args, **kwargs)
 
 
 class TextSplitterConfig(BaseModel):
@@ -63,7 +88,7 @@ class TextSplitterConfig(BaseModel):
     @field_validator("class_name", mode="after")
     @classmethod
     def is_valid_loader(cls, name: str) -> str:
-        if not hasattr(langchain_text_splitters, name):
+        if name not in langchain_text_splitters.__all__:
             raise ValueError(
                 f"{name} is not a valid langchain_text_splitters text splitter"
             )
@@ -88,6 +113,91 @@ class TextSplitterConfig(BaseModel):
 
 class ExtractorConfig(BaseModel):
     without_references: bool = False
+    # "bisect" assumes the references run to the end of the article and
+    # probes O(log n) pages instead of scanning back to front
+    references_search: Literal["linear", "bisect"] = "linear"
+    # "heuristic" locates the references from headings and citation patterns
+    # and only asks the LLM when its confidence is below the threshold
+    references_detector: Literal["llm", "heuristic"] = "llm"
+    references_min_confidence: float = 0.75
+    # start metadata and front-matter keyword extraction while the
+    # references are still being located
+    pipelined: bool = False
+    speculative_fraction: float = Field(default=0.5, ge=0, le=1)
+    # split and submit pages while the document is still being parsed; the
+    # references search needs every page, so this is ignored together with
+    # without_references
+    streaming: bool = False
+    max_in_flight_chunks: int = Field(default=32, ge=1)
+    # count the mentions of every entity and record the chunks it came from;
+    # duplicates are merged either way
+    track_mentions: bool = False
+    # "thread" runs the pipeline on a thread pool of max_workers threads,
+    # "async" runs it on an event loop. Chat model clients can't be pickled,
+    # so process pools aren't supported.
+    executor: Literal["thread", "async"] = "thread"
+    max_workers: int = Field(default=4, ge=1)
+    # caps on concurrent LLM calls per stage, across every article in the
+    # process; unset means no cap beyond the pool or concurrency limit
+    metadata_concurrency: int | None = Field(default=None, ge=1)
+    keywords_concurrency: int | None = Field(default=None, ge=1)
+    references_concurrency: int | None = Field(default=None, ge=1)
+
+
+class CacheConfig(BaseModel):
+    # no caching unless a path is given
+    path: str | None = None
+    max_size_mb: float = 512
+
+    def create_cache(self) -> ResponseCache | None:
+        if self.path is None:
+            return None
+        return ResponseCache(self.path, max_size_bytes=int(self.max_size_mb * 1024**2))
+
+
+class RateLimitConfig(BaseModel):
+    # budgets from the OpenAI account limits; no limiting when both are unset
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+    max_concurrency: int = Field(default=64, ge=1)
+    min_concurrency: int = Field(default=1, ge=1)
+    # back off concurrency when requests take longer than this many seconds
+    latency_target: float | None = None
+    max_retries: int = Field(default=6, ge=0)
+    # added to the prompt token estimate to account for the response
+    completion_tokens: int = 512
+
+    @property
+    def enabled(self) -> bool:
+        return (
+            self.requests_per_minute is not None or self.tokens_per_minute is not None
+        )
+
+    def create_rate_limiter(self) -> RateLimiter | None:
+        if not self.enabled:
+            return None
+        return RateLimiter(
+            requests_per_minute=self.requests_per_minute,
+            tokens_per_minute=self.tokens_per_minute,
+            max_concurrency=self.max_concurrency,
+            min_concurrency=self.min_concurrency,
+            latency_target=self.latency_target,
+            max_retries=self.max_retries,
+        )
+
+
+class NormalizationConfig(BaseModel):
+    # links extracted metabolites to this ChEBI database (db.tsv or the
+    # binary db.bin from chebi/merge_db.py); off unless a path is given
+    chebi_database: str | None = None
+    engine: Literal["index", "matrix"] = "index"
+    # fuzzy matches scoring below this are left unlinked
+    min_score: float = Field(default=0.8, ge=0, le=1)
+
+    def create_linker(self) -> ChebiLinker | None:
+        if self.chebi_database is None:
+            return None
+        return load_linker(self.chebi_database, self.engine, self.min_score)
 
 
 class Config(BaseModel):
@@ -97,3 +207,19 @@ class Config(BaseModel):
     pdf_loader: PDFLoaderConfig = Field(default_factory=PDFLoaderConfig)
     text_splitter: TextSplitterConfig = Field(default_factory=TextSplitterConfig)
     extractor: ExtractorConfig = Field(default_factory=ExtractorConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
+    normalization: NormalizationConfig = Field(default_factory=NormalizationConfig)
+
+    def create_model(self) -> "ChatOpenAI":
+        """Creates the chat model for `model_name` and `temperature`.
+
+        When rate limiting is on, the OpenAI client's own retries are turned
+        off, so that every 429 reaches the `RateLimiter` and halves its
+        concurrency instead of being retried behind its back.
+        """
+        # imported here so that loading a config doesn't need OpenAI
+        from langchain_openai import ChatOpenAI
+
+        kwargs = {"max_retries": 0} if self.rate_limit.enabled else {}
+        return ChatOpenAI(model=self.model_name, temperature=self.temperature, **kwargs)
@@ -1,19 +1,34 @@
+import asyncio
+import math
+import threading
+from contextlib import nullcontext
 from logging import getLogger
-from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from typing import Iterable, Literal
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 
 from langchain_community.document_loaders.base import BaseLoader
 from langchain_core.documents.base import Document
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_text_splitters.base import TextSplitter
 
-from viime_extract.schema import Article, ArticleKeyWords, ArticleMeta
+from viime_extract.schema import (
+    Article,
+    ArticleKeyWords,
+    ArticleKeyWordsAccumulator,
+    ArticleMeta,
+)
 from viime_extract.config import (
+    Config,
     Prompt,
     DetectReferencesPrompt,
     ArticleKeywordsPrompt,
     ArticleMetadataPrompt,
 )
-from viime_extract.references import get_start_of_references_idx
+from viime_extract.llm import ainvoke_structured, invoke_structured
+from viime_extract.references import (
+    afind_start_of_references,
+    find_start_of_references,
+)
 
 logging = getLogger(__name__)
 
@@ -26,7 +41,7 @@ def extract_article_metadata(
 
     template = prompt.get_template()
     llm_input = template.invoke({"article_contents": first_page})
-    return model.with_structured_output(ArticleMeta).invoke(llm_input)
+    return invoke_structured(model, ArticleMeta, llm_input, stage="metadata")
 
 
 def extract_article_metadata_with_executor(
@@ -40,19 +55,37 @@ def extract_article_keywords_from_doc(
 ):
     template = prompt.get_template()
     llm_input = template.invoke({"article_contents": doc.page_content})
-    return model.with_structured_output(ArticleKeyWords).invoke(llm_input)
+    return invoke_structured(model, ArticleKeyWords, llm_input, stage="keywords")
+
+
+def merge_chunk_keywords(
+    responses: Iterable[ArticleKeyWords], track_mentions=False
+) -> ArticleKeyWords:
+    """Merges the keywords of each chunk, in chunk order, without duplicates.
+
+    With `track_mentions`, every entity also counts how many times it was
+    extracted and from which chunks.
+    """
+    keywords = ArticleKeyWordsAccumulator()
+    for idx, response in enumerate(responses):
+        keywords.add(response, idx if track_mentions else None)
+    return keywords.build()
 
 
 def extract_article_keywords(
-    pages: list[Document], model: BaseChatModel, splitter: TextSplitter, prompt: Prompt
+    pages: list[Document],
+    model: BaseChatModel,
+    splitter: TextSplitter,
+    prompt: Prompt,
+    track_mentions=False,
 ):
-    keywords = ArticleKeyWords()
-    for text_chunk in splitter.split_documents(pages):
-        response = extract_article_keywords_from_doc(text_chunk, model, prompt)
-        keywords = keywords.merge(response)
-
-    # TODO duplicate removal
-    return keywords
+    return merge_chunk_keywords(
+        (
+            extract_article_keywords_from_doc(text_chunk, model, prompt)
+            for text_chunk in splitter.split_documents(pages)
+        ),
+        track_mentions,
+    )
 
 
 def extract_article_keywords_with_executor(
@@ -61,18 +94,14 @@ def extract_article_keywords_with_executor(
     splitter: TextSplitter,
     prompt: Prompt,
     executor: Executor,
+    track_mentions=False,
 ):
-    keywords = ArticleKeyWords()
     futures = [
         executor.submit(extract_article_keywords_from_doc, text_chunk, model, prompt)
         for text_chunk in splitter.split_documents(pages)
     ]
-
-    for future in as_completed(futures):
-        keywords = keywords.merge(future.result())
-
-    # TODO duplicate removal
-    return keywords
+    # merged in chunk order, so that the output doesn't depend on timing
+    return merge_chunk_keywords((future.result() for future in futures), track_mentions)
 
 
 def extract_article_from_document_loader(
@@ -84,12 +113,72 @@ def extract_article_from_document_loader(
     article_metadata_prompt: ArticleMetadataPrompt,
     article_keywords_prompt: ArticleKeywordsPrompt,
     without_references=False,
+    references_search: Literal["linear", "bisect"] = "linear",
+    references_detector: Literal["llm", "heuristic"] = "llm",
+    references_min_confidence: float = 0.75,
+    pipelined=False,
+    speculative_fraction: float = 0.5,
+    streaming=False,
+    max_in_flight_chunks: int = 32,
+    track_mentions=False,
+    executor: Executor | None = None,
+    max_workers: int = 4,
 ):
-    with ThreadPoolExecutor(max_workers=4) as executor:
+    """Extracts the metadata and keywords of the article from `doc_loader`.
+
+    Work runs on `executor` when one is given, so that a long-lived process
+    can share one pool across articles; otherwise a pool of `max_workers`
+    threads is created for the article and shut down afterwards.
+    """
+    with (
+        ThreadPoolExecutor(max_workers=max_workers)
+        if executor is None
+        else nullcontext(executor)
+    ) as executor:
+        if streaming and not without_references:
+            return extract_article_streaming(
+                doc_loader,
+                model=model,
+                splitter=splitter,
+                article_metadata_prompt=article_metadata_prompt,
+                article_keywords_prompt=article_keywords_prompt,
+                executor=executor,
+                max_in_flight_chunks=max_in_flight_chunks,
+                track_mentions=track_mentions,
+            )
+
         pages = list(doc_loader.lazy_load())
+        if without_references and pipelined:
+            return extract_article_pipelined(
+                pages,
+                model=model,
+                splitter=splitter,
+                detect_references_prompt=detect_references_prompt,
+                article_metadata_prompt=article_metadata_prompt,
+                article_keywords_prompt=article_keywords_prompt,
+                executor=executor,
+                references_search=references_search,
+                references_detector=references_detector,
+                references_min_confidence=references_min_confidence,
+                speculative_fraction=speculative_fraction,
+                track_mentions=track_mentions,
+            )
+
         if without_references:
-            limit = get_start_of_references_idx(pages, model, detect_references_prompt)
-            logging.info("Ignoring pages starting with index %d", limit)
+            location = find_start_of_references(
+                pages,
+                model,
+                detect_references_prompt,
+                detector=references_detector,
+                search=references_search,
+                min_confidence=references_min_confidence,
+            )
+            limit = location.index
+            logging.info(
+                "Ignoring pages starting with index %d (found by %s)",
+                limit,
+                location.method,
+            )
         else:
             limit = len(pages)
 
@@ -100,6 +189,455 @@ def extract_article_from_document_loader(
             extract_article_metadata, pages[:limit], model, article_metadata_prompt
         )
         keywords = extract_article_keywords_with_executor(
-            pages[:limit], model, splitter, article_keywords_prompt, executor
+            pages[:limit],
+            model,
+            splitter,
+            article_keywords_prompt,
+            executor,
+            track_mentions,
         )
         return Article(meta=meta_future.result(), keywords=keywords)
+
+
+def extract_article_pipelined(
+    pages: list[Document],
+    *,
+    model: BaseChatModel,
+    splitter: TextSplitter,
+    detect_references_prompt: DetectReferencesPrompt,
+    article_metadata_prompt: ArticleMetadataPrompt,
+    article_keywords_prompt: ArticleKeywordsPrompt,
+    executor: Executor,
+    references_search: Literal["linear", "bisect"] = "linear",
+    references_detector: Literal["llm", "heuristic"] = "llm",
+    references_min_confidence: float = 0.75,
+    speculative_fraction: float = 0.5,
+    track_mentions=False,
+):
+    """Extracts an article without references while they are being located.
+
+    Metadata and the chunks of the first `speculative_fraction` of the pages
+    are submitted before the references search starts. Later chunks are
+    submitted as soon as the search knows the references start past them.
+    Speculative chunks that turn out to be references are cancelled, or
+    their results dropped.
+    """
+    # split page by page so that every chunk knows which page it came from
+    chunks_by_page = [splitter.split_documents([page]) for page in pages]
+    chunk_futures: list[tuple[int, Future]] = []
+    submitted = 0
+
+    def submit_pages_before(page_idx: int):
+        nonlocal submitted
+        page_idx = min(page_idx, len(pages))
+        for idx in range(submitted, page_idx):
+            for text_chunk in chunks_by_page[idx]:
+                future = executor.submit(
+                    extract_article_keywords_from_doc,
+                    text_chunk,
+                    model,
+                    article_keywords_prompt,
+                )
+                chunk_futures.append((idx, future))
+        submitted = max(submitted, page_idx)
+
+    meta_future = executor.submit(
+        extract_article_metadata, pages, model, article_metadata_prompt
+    )
+    submit_pages_before(math.ceil(len(pages) * speculative_fraction))
+
+    location = find_start_of_references(
+        pages,
+        model,
+        detect_references_prompt,
+        detector=references_detector,
+        search=references_search,
+        min_confidence=references_min_confidence,
+        on_lower_bound=submit_pages_before,
+    )
+    limit = location.index or len(pages)
+    logging.info(
+        "Ignoring pages starting with index %d (found by %s)", limit, location.method
+    )
+    submit_pages_before(limit)
+
+    futures = []
+    for idx, future in chunk_futures:
+        if idx < limit:
+            futures.append(future)
+        else:
+            future.cancel()
+    logging.debug("Dropped %d speculative chunks", len(chunk_futures) - len(futures))
+
+    keywords = merge_chunk_keywords(
+        (future.result() for future in futures), track_mentions
+    )
+    return Article(meta=meta_future.result(), keywords=keywords)
+
+
+def extract_article_streaming(
+    doc_loader: BaseLoader,
+    *,
+    model: BaseChatModel,
+    splitter: TextSplitter,
+    article_metadata_prompt: ArticleMetadataPrompt,
+    article_keywords_prompt: ArticleKeywordsPrompt,
+    executor: Executor,
+    max_in_flight_chunks: int = 32,
+    track_mentions=False,
+):
+    """Extracts an article while its pages are still being loaded.
+
+    Each page is split and its chunks submitted as soon as the loader yields
+    it. At most `max_in_flight_chunks` chunks are pending at a time; beyond
+    that, loading pauses until a request completes, so the memory held does
+    not grow with the size of the document.
+    """
+    in_flight = threading.BoundedSemaphore(max_in_flight_chunks)
+    meta_future = None
+    futures = []
+
+    for page in doc_loader.lazy_load():
+        if meta_future is None:
+            meta_future = executor.submit(
+                extract_article_metadata, [page], model, article_metadata_prompt
+            )
+        for text_chunk in splitter.split_documents([page]):
+            in_flight.acquire()
+            future = executor.submit(
+                extract_article_keywords_from_doc,
+                text_chunk,
+                model,
+                article_keywords_prompt,
+            )
+            future.add_done_callback(lambda _: in_flight.release())
+            futures.append(future)
+
+    if meta_future is None:
+        raise ValueError("The document loader did not produce any pages")
+
+    keywords = merge_chunk_keywords(
+        (future.result() for future in futures), track_mentions
+    )
+    return Article(meta=meta_future.result(), keywords=keywords)
+
+
+async def aextract_article_metadata(
+    pages: list[Document], model: BaseChatModel, prompt: Prompt
+):
+    # assumption: first page contains all of the metadata
+    first_page = pages[0].page_content
+
+    template = prompt.get_template()
+    llm_input = await template.ainvoke({"article_contents": first_page})
+    return await ainvoke_structured(model, ArticleMeta, llm_input, stage="metadata")
+
+
+async def aextract_article_keywords_from_doc(
+    doc: Document, model: BaseChatModel, prompt: Prompt
+):
+    template = prompt.get_template()
+    llm_input = await template.ainvoke({"article_contents": doc.page_content})
+    return await ainvoke_structured(model, ArticleKeyWords, llm_input, stage="keywords")
+
+
+async def aextract_article_keywords(
+    pages: list[Document],
+    model: BaseChatModel,
+    splitter: TextSplitter,
+    prompt: Prompt,
+    track_mentions=False,
+):
+    tasks = [
+        asyncio.create_task(
+            aextract_article_keywords_from_doc(text_chunk, model, prompt)
+        )
+        for text_chunk in splitter.split_documents(pages)
+    ]
+
+    try:
+        return merge_chunk_keywords(await asyncio.gather(*tasks), track_mentions)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def aextract_article_pipelined(
+    pages: list[Document],
+    *,
+    model: BaseChatModel,
+    splitter: TextSplitter,
+    detect_references_prompt: DetectReferencesPrompt,
+    article_metadata_prompt: ArticleMetadataPrompt,
+    article_keywords_prompt: ArticleKeywordsPrompt,
+    references_search: Literal["linear", "bisect"] = "linear",
+    references_detector: Literal["llm", "heuristic"] = "llm",
+    references_min_confidence: float = 0.75,
+    speculative_fraction: float = 0.5,
+    track_mentions=False,
+):
+    """Async counterpart of `extract_article_pipelined`."""
+    chunks_by_page = [splitter.split_documents([page]) for page in pages]
+    chunk_tasks: list[tuple[int, asyncio.Task]] = []
+    submitted = 0
+
+    def submit_pages_before(page_idx: int):
+        nonlocal submitted
+        page_idx = min(page_idx, len(pages))
+        for idx in range(submitted, page_idx):
+            for text_chunk in chunks_by_page[idx]:
+                task = asyncio.create_task(
+                    aextract_article_keywords_from_doc(
+                        text_chunk, model, article_keywords_prompt
+                    )
+                )
+                chunk_tasks.append((idx, task))
+        submitted = max(submitted, page_idx)
+
+    meta_task = asyncio.create_task(
+        aextract_article_metadata(pages, model, article_metadata_prompt)
+    )
+    submit_pages_before(math.ceil(len(pages) * speculative_fraction))
+
+    try:
+        location = await afind_start_of_references(
+            pages,
+            model,
+            detect_references_prompt,
+            detector=references_detector,
+            search=references_search,
+            min_confidence=references_min_confidence,
+            on_lower_bound=submit_pages_before,
+        )
+        limit = location.index or len(pages)
+        logging.info(
+            "Ignoring pages starting with index %d (found by %s)",
+            limit,
+            location.method,
+        )
+        submit_pages_before(limit)
+
+        tasks = []
+        for idx, task in chunk_tasks:
+            if idx < limit:
+                tasks.append(task)
+            else:
+                task.cancel()
+        logging.debug("Dropped %d speculative chunks", len(chunk_tasks) - len(tasks))
+
+        keywords = merge_chunk_keywords(await asyncio.gather(*tasks), track_mentions)
+        return Article(meta=await meta_task, keywords=keywords)
+    finally:
+        meta_task.cancel()
+        for _, task in chunk_tasks:
+            task.cancel()
+
+
+async def aextract_article_streaming(
+    doc_loader: BaseLoader,
+    *,
+    model: BaseChatModel,
+    splitter: TextSplitter,
+    article_metadata_prompt: ArticleMetadataPrompt,
+    article_keywords_prompt: ArticleKeywordsPrompt,
+    max_in_flight_chunks: int = 32,
+    track_mentions=False,
+):
+    """Async counterpart of `extract_article_streaming`."""
+    in_flight = asyncio.Semaphore(max_in_flight_chunks)
+    meta_task = None
+    tasks = []
+
+    async def extract_chunk(text_chunk: Document):
+        try:
+            return await aextract_article_keywords_from_doc(
+                text_chunk, model, article_keywords_prompt
+            )
+        finally:
+            in_flight.release()
+
+    try:
+        async for page in doc_loader.alazy_load():
+            if meta_task is None:
+                meta_task = asyncio.create_task(
+                    aextract_article_metadata([page], model, article_metadata_prompt)
+                )
+            for text_chunk in splitter.split_documents([page]):
+                await in_flight.acquire()
+                tasks.append(asyncio.create_task(extract_chunk(text_chunk)))
+
+        if meta_task is None:
+            raise ValueError("The document loader did not produce any pages")
+
+        keywords = merge_chunk_keywords(await asyncio.gather(*tasks), track_mentions)
+        return Article(meta=await meta_task, keywords=keywords)
+    finally:
+        if meta_task is not None:
+            meta_task.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+async def aextract_article_from_document_loader(
+    *,
+    model: BaseChatModel,
+    splitter: TextSplitter,
+    doc_loader: BaseLoader,
+    detect_references_prompt: DetectReferencesPrompt,
+    article_metadata_prompt: ArticleMetadataPrompt,
+    article_keywords_prompt: ArticleKeywordsPrompt,
+    without_references=False,
+    references_search: Literal["linear", "bisect"] = "linear",
+    references_detector: Literal["llm", "heuristic"] = "llm",
+    references_min_confidence: float = 0.75,
+    pipelined=False,
+    speculative_fraction: float = 0.5,
+    streaming=False,
+    max_in_flight_chunks: int = 32,
+    track_mentions=False,
+):
+    """Async counterpart of `extract_article_from_document_loader`.
+
+    All LLM requests share the global limit set by
+    `viime_extract.llm.set_concurrency_limit`, so many articles can be
+    extracted concurrently on a single event loop.
+    """
+    if streaming and not without_references:
+        return await aextract_article_streaming(
+            doc_loader,
+            model=model,
+            splitter=splitter,
+            article_metadata_prompt=article_metadata_prompt,
+            article_keywords_prompt=article_keywords_prompt,
+            max_in_flight_chunks=max_in_flight_chunks,
+            track_mentions=track_mentions,
+        )
+
+    pages = [page async for page in doc_loader.alazy_load()]
+    if without_references and pipelined:
+        return await aextract_article_pipelined(
+            pages,
+            model=model,
+            splitter=splitter,
+            detect_references_prompt=detect_references_prompt,
+            article_metadata_prompt=article_metadata_prompt,
+            article_keywords_prompt=article_keywords_prompt,
+            references_search=references_search,
+            references_detector=references_detector,
+            references_min_confidence=references_min_confidence,
+            speculative_fraction=speculative_fraction,
+            track_mentions=track_mentions,
+        )
+
+    if without_references:
+        location = await afind_start_of_references(
+            pages,
+            model,
+            detect_references_prompt,
+            detector=references_detector,
+            search=references_search,
+            min_confidence=references_min_confidence,
+        )
+        limit = location.index
+        logging.info(
+            "Ignoring pages starting with index %d (found by %s)",
+            limit,
+            location.method,
+        )
+    else:
+        limit = len(pages)
+
+    if limit == 0:
+        limit = len(pages)
+
+    meta, keywords = await asyncio.gather(
+        aextract_article_metadata(pages[:limit], model, article_metadata_prompt),
+        aextract_article_keywords(
+            pages[:limit], model, splitter, article_keywords_prompt, track_mentions
+        ),
+    )
+    return Article(meta=meta, keywords=keywords)
+
+
+def _extraction_options(config: Config) -> dict:
+    extractor = config.extractor
+    return dict(
+        detect_references_prompt=config.prompts.detect_references,
+        article_metadata_prompt=config.prompts.article_metadata,
+        article_keywords_prompt=config.prompts.article_keywords,
+        without_references=extractor.without_references,
+        references_search=extractor.references_search,
+        references_detector=extractor.references_detector,
+        references_min_confidence=extractor.references_min_confidence,
+        pipelined=extractor.pipelined,
+        speculative_fraction=extractor.speculative_fraction,
+        streaming=extractor.streaming,
+        max_in_flight_chunks=extractor.max_in_flight_chunks,
+        track_mentions=extractor.track_mentions,
+    )
+
+
+def _normalize_keywords(config: Config, keywords: ArticleKeyWords):
+    if (linker := config.normalization.create_linker()) is not None:
+        linker.link_keywords(keywords)
+
+
+def extract_article_from_config(
+    config: Config,
+    *,
+    model: BaseChatModel,
+    doc_loader: BaseLoader,
+    splitter: TextSplitter | None = None,
+    executor: Executor | None = None,
+):
+    """Extracts an article with the prompts and extractor settings in `config`.
+
+    Runs the async pipeline on a new event loop when `config.extractor.executor`
+    is "async", otherwise uses `executor` or a new thread pool. Passing an
+    `executor` with the async pipeline raises a `ValueError`.
+    """
+    if config.extractor.executor == "async" and executor is not None:
+        raise ValueError("An executor can't be used with the async extractor")
+
+    if splitter is None:
+        splitter = config.text_splitter.create_splitter()
+
+    if config.extractor.executor == "async":
+        return asyncio.run(
+            aextract_article_from_config(
+                config, model=model, doc_loader=doc_loader, splitter=splitter
+            )
+        )
+
+    article = extract_article_from_document_loader(
+        model=model,
+        splitter=splitter,
+        doc_loader=doc_loader,
+        executor=executor,
+        max_workers=config.extractor.max_workers,
+        **_extraction_options(config),
+    )
+    _normalize_keywords(config, article.keywords)
+    return article
+
+
+async def aextract_article_from_config(
+    config: Config,
+    *,
+    model: BaseChatModel,
+    doc_loader: BaseLoader,
+    splitter: TextSplitter | None = None,
+):
+    if splitter is None:
+        splitter = config.text_splitter.create_splitter()
+
+    article = await aextract_article_from_document_loader(
+        model=model,
+        splitter=splitter,
+        doc_loader=doc_loader,
+        **_extraction_options(config),
+    )
+    if config.normalization.chebi_database is not None:
+        # loading the database and fuzzy matching are CPU-bound
+        await asyncio.to_thread(_normalize_keywords, config, article.keywords)
+    return article
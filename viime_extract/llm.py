@@ -0,0 +1,220 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import Literal, TypeVar
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+
+from viime_extract.cache import ResponseCache, make_cache_key
+from viime_extract.config import Config
+from viime_extract.ratelimit import RateLimiter, estimate_tokens
+
+T = TypeVar("T", bound=BaseModel)
+
+Stage = Literal["metadata", "keywords", "references"]
+
+DEFAULT_CONCURRENCY_LIMIT = 64
+# structured-output runnables kept for reuse, least recently used dropped first
+MAX_STRUCTURED_RUNNABLES = 32
+
+_concurrency_limit = DEFAULT_CONCURRENCY_LIMIT
+_semaphores: dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+_response_cache: ResponseCache | None = None
+_rate_limiter: RateLimiter | None = None
+_completion_tokens = 0
+_stage_limits: dict[str, int] = {}
+_stage_semaphores: dict[str, threading.BoundedSemaphore] = {}
+_async_stage_semaphores: dict[
+    tuple[asyncio.AbstractEventLoop, str], asyncio.Semaphore
+] = {}
+# keyed by model identity; the model is kept with its runnable so that its
+# id can't be reused by another model while the entry exists
+_structured_runnables: OrderedDict[
+    tuple[int, type[BaseModel]], tuple[BaseChatModel, Runnable]
+] = OrderedDict()
+_structured_runnables_lock = threading.Lock()
+
+
+def configure(config: Config):
+    """Applies the process-wide LLM settings from a `Config`."""
+    set_response_cache(config.cache.create_cache())
+    set_rate_limiter(
+        config.rate_limit.create_rate_limiter(), config.rate_limit.completion_tokens
+    )
+    set_stage_limit("metadata", config.extractor.metadata_concurrency)
+    set_stage_limit("keywords", config.extractor.keywords_concurrency)
+    set_stage_limit("references", config.extractor.references_concurrency)
+
+
+def set_stage_limit(stage: Stage, limit: int | None):
+    """Caps the number of concurrent LLM calls made by one pipeline stage."""
+    if limit is not None and limit < 1:
+        raise ValueError("Stage limit must be at least 1")
+    if limit is None:
+        _stage_limits.pop(stage, None)
+        _stage_semaphores.pop(stage, None)
+    else:
+        _stage_limits[stage] = limit
+        _stage_semaphores[stage] = threading.BoundedSemaphore(limit)
+    for key in [key for key in _async_stage_semaphores if key[1] == stage]:
+        del _async_stage_semaphores[key]
+
+
+@contextmanager
+def _stage_slot(stage: Stage | None):
+    semaphore = _stage_semaphores.get(stage) if stage else None
+    with semaphore if semaphore is not None else nullcontext():
+        yield
+
+
+@asynccontextmanager
+async def _astage_slot(stage: Stage | None):
+    if stage is None or stage not in _stage_limits:
+        yield
+        return
+
+    loop = asyncio.get_running_loop()
+    semaphore = _async_stage_semaphores.get((loop, stage))
+    if semaphore is None:
+        semaphore = _async_stage_semaphores[(loop, stage)] = asyncio.Semaphore(
+            _stage_limits[stage]
+        )
+    async with semaphore:
+        yield
+
+
+def set_rate_limiter(limiter: RateLimiter | None, completion_tokens: int = 0):
+    global _rate_limiter, _completion_tokens
+    _rate_limiter = limiter
+    _completion_tokens = completion_tokens
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    return _rate_limiter
+
+
+def set_response_cache(cache: ResponseCache | None):
+    global _response_cache
+    _response_cache = cache
+
+
+def get_response_cache() -> ResponseCache | None:
+    return _response_cache
+
+
+def set_concurrency_limit(limit: int):
+    """Sets the maximum number of in-flight async LLM requests per event loop."""
+    global _concurrency_limit
+    if limit < 1:
+        raise ValueError("Concurrency limit must be at least 1")
+    _concurrency_limit = limit
+    _semaphores.clear()
+
+
+def get_concurrency_limit() -> int:
+    return _concurrency_limit
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        # drop semaphores belonging to loops that have since been closed
+        for stale in [lp for lp in _semaphores if lp.is_closed()]:
+            del _semaphores[stale]
+        semaphore = _semaphores[loop] = asyncio.Semaphore(_concurrency_limit)
+    return semaphore
+
+
+def get_structured_runnable(model: BaseChatModel, schema: type[T]) -> Runnable:
+    """Returns `model.with_structured_output(schema)`, built once per model
+    and schema and shared between threads.
+
+    Building it converts the schema into a tool definition, which costs
+    more Python time per chunk than the rest of the call setup together.
+    """
+    key = (id(model), schema)
+    with _structured_runnables_lock:
+        if (entry := _structured_runnables.get(key)) is not None:
+            _structured_runnables.move_to_end(key)
+            return entry[1]
+
+    runnable = model.with_structured_output(schema)
+    with _structured_runnables_lock:
+        entry = _structured_runnables.setdefault(key, (model, runnable))
+        while len(_structured_runnables) > MAX_STRUCTURED_RUNNABLES:
+            _structured_runnables.popitem(last=False)
+    return entry[1]
+
+
+def _cache_lookup(
+    model: BaseChatModel, schema: type[T], llm_input: PromptValue
+) -> tuple[str | None, T | None]:
+    cache = _response_cache
+    if cache is None:
+        return None, None
+    key = make_cache_key(model, schema, llm_input)
+    value = cache.get(key)
+    return key, None if value is None else schema.model_validate_json(value)
+
+
+def _cache_store(key: str | None, response: BaseModel | None):
+    cache = _response_cache
+    if cache is not None and key is not None and response is not None:
+        cache.set(key, response.model_dump_json())
+
+
+def _estimate_tokens(model: BaseChatModel, llm_input: PromptValue) -> int:
+    model_name = getattr(model, "model_name", None)
+    return estimate_tokens(llm_input.to_string(), model_name) + _completion_tokens
+
+
+def invoke_structured(
+    model: BaseChatModel,
+    schema: type[T],
+    llm_input: PromptValue,
+    stage: Stage | None = None,
+) -> T:
+    key, cached = _cache_lookup(model, schema, llm_input)
+    if cached is not None:
+        return cached
+
+    runnable = get_structured_runnable(model, schema)
+    limiter = _rate_limiter
+    with _stage_slot(stage):
+        if limiter is None:
+            response = runnable.invoke(llm_input)
+        else:
+            response = limiter.call(
+                lambda: runnable.invoke(llm_input), _estimate_tokens(model, llm_input)
+            )
+    _cache_store(key, response)
+    return response
+
+
+async def ainvoke_structured(
+    model: BaseChatModel,
+    schema: type[T],
+    llm_input: PromptValue,
+    stage: Stage | None = None,
+) -> T:
+    key, cached = _cache_lookup(model, schema, llm_input)
+    if cached is not None:
+        return cached
+
+    runnable = get_structured_runnable(model, schema)
+    limiter = _rate_limiter
+    async with _astage_slot(stage), _get_semaphore():
+        if limiter is None:
+            response = await runnable.ainvoke(llm_input)
+        else:
+            response = await limiter.acall(
+                lambda: runnable.ainvoke(llm_input),
+                _estimate_tokens(model, llm_input),
+            )
+    _cache_store(key, response)
+    return response
@@ -0,0 +1,133 @@
+import asyncio
+import random
+from logging import getLogger
+from typing import Iterable
+
+import httpx
+
+from viime_extract.cache import ResponseCache
+from viime_extract.ratelimit import TokenBucket
+
+logging = getLogger(__name__)
+
+PUBCHEM_URL = "https://pubchem.ncbi.nlm.nih.gov/rest/pug"
+# PubChem asks for at most 5 requests a second
+PUBCHEM_REQUESTS_PER_SECOND = 5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# cached for CIDs without a ChEBI cross-reference, so they aren't re-fetched
+_NO_CHEBI_ID = ""
+
+
+def get_chebi_id(information: dict) -> str | None:
+    for line in information.get("SBURL", []):
+        if "chebiId=CHEBI:" in line:
+            return line.rsplit(":", 1)[1]
+    return None
+
+
+class PubChemResolver:
+    """Looks up the ChEBI IDs of PubChem compounds through PUG-REST.
+
+    CIDs are requested in comma-separated batches over one pooled client,
+    throttled to PubChem's request rate and retried with jittered backoff
+    on throttling and server errors. Answers, including CIDs without a
+    ChEBI ID, are kept in an optional persistent cache.
+    """
+
+    def __init__(
+        self,
+        cache: ResponseCache | None = None,
+        base_url: str = PUBCHEM_URL,
+        requests_per_second: float = PUBCHEM_REQUESTS_PER_SECOND,
+        batch_size: int = 100,
+        max_concurrency: int = 5,
+        max_retries: int = 5,
+        max_backoff: float = 30.0,
+        timeout: float = 30.0,
+    ):
+        self.cache = cache
+        self.base_url = base_url
+        self.requests = TokenBucket(
+            requests_per_second * 60, capacity=requests_per_second
+        )
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+    @staticmethod
+    def _cache_key(cid: str) -> str:
+        return f"pubchem-chebi:{cid}"
+
+    async def _get(self, client: httpx.AsyncClient, url: str) -> httpx.Response:
+        for attempt in range(self.max_retries + 1):
+            await self.requests.aacquire()
+            try:
+                response = await client.get(url)
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning("Request to %s failed, retrying", url, exc_info=True)
+            else:
+                if (
+                    response.status_code not in RETRY_STATUS_CODES
+                    or attempt == self.max_retries
+                ):
+                    return response
+                logging.info("PubChem answered %d, retrying", response.status_code)
+
+            await asyncio.sleep(random.uniform(0, min(self.max_backoff, 2**attempt)))
+
+    async def _fetch_batch(
+        self, client: httpx.AsyncClient, cids: list[str]
+    ) -> dict[str, str | None]:
+        response = await self._get(
+            client, f"/compound/cid/{','.join(cids)}/xrefs/SBURL/JSON"
+        )
+        # PubChem answers 404 when none of the CIDs has a cross-reference
+        if response.status_code == 404:
+            return {cid: None for cid in cids}
+        response.raise_for_status()
+
+        found = {
+            str(information["CID"]): get_chebi_id(information)
+            for information in response.json()["InformationList"]["Information"]
+        }
+        return {cid: found.get(cid) for cid in cids}
+
+    async def resolve(self, cids: Iterable[str]) -> dict[str, str | None]:
+        """Maps every CID to its ChEBI ID, or None when it has none."""
+        results: dict[str, str | None] = {}
+        missing = []
+        for cid in dict.fromkeys(cids):
+            cached = (
+                self.cache.get(self._cache_key(cid)) if self.cache is not None else None
+            )
+            if cached is None:
+                missing.append(cid)
+            else:
+                results[cid] = cached or None
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limits = httpx.Limits(max_connections=self.max_concurrency)
+
+        async def fetch(client: httpx.AsyncClient, batch: list[str]):
+            async with semaphore:
+                found = await self._fetch_batch(client, batch)
+            for cid, chebi_id in found.items():
+                results[cid] = chebi_id
+                if self.cache is not None:
+                    self.cache.set(self._cache_key(cid), chebi_id or _NO_CHEBI_ID)
+
+        async with httpx.AsyncClient(
+            base_url=self.base_url, timeout=self.timeout, limits=limits
+        ) as client:
+            await asyncio.gather(
+                *(
+                    fetch(client, missing[i : i + self.batch_size])
+                    for i in range(0, len(missing), self.batch_size)
+                )
+            )
+        return results
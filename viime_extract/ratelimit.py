@@ -0,0 +1,252 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from logging import getLogger
+from typing import Awaitable, Callable, TypeVar
+
+import tiktoken
+
+logging = getLogger(__name__)
+
+T = TypeVar("T")
+
+# OpenAI enforces the per-minute limits over shorter windows, so a full
+# bucket must not release a whole minute's budget at once
+BURST_SECONDS = 5
+
+
+@lru_cache
+def _get_encoding(model_name: str | None) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name or "")
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def estimate_tokens(text: str, model_name: str | None = None) -> int:
+    return len(_get_encoding(model_name).encode(text, disallowed_special=()))
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    return (
+        getattr(exc, "status_code", None) == 429
+        or type(exc).__name__ == "RateLimitError"
+    )
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `per_minute` tokens a minute.
+
+    Callers reserve tokens up front; a reservation larger than what is
+    available puts the bucket into debt and returns how long to wait.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = per_minute / 60
+        self.capacity = per_minute if capacity is None else capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, amount: float = 1):
+        if wait := self.reserve(amount):
+            time.sleep(wait)
+
+    async def aacquire(self, amount: float = 1):
+        if wait := self.reserve(amount):
+            await asyncio.sleep(wait)
+
+
+class AdaptiveConcurrency:
+    """A concurrency limit adjusted by additive increase/multiplicative decrease.
+
+    The limit grows by roughly one slot per round of successful requests,
+    halves on a rate-limit response and shrinks slightly when latency is
+    above `latency_target`. Both threads and coroutines may wait for slots.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: int | None = None,
+        latency_target: float | None = None,
+        cooldown: float = 5.0,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial_limit or max(min_limit, max_limit // 4))
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._async_waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = (
+            deque()
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _try_acquire(self) -> bool:
+        if self._in_flight < int(self.limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def _wake_waiters(self):
+        self._condition.notify_all()
+        while self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, future)
+
+    def acquire(self):
+        with self._condition:
+            while not self._try_acquire():
+                self._condition.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._wake_waiters()
+
+    def on_success(self, latency: float):
+        with self._lock:
+            if self.latency_target is not None and latency > self.latency_target:
+                self._decrease(0.9)
+            else:
+                slots = int(self.limit)
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                if int(self.limit) > slots:
+                    self._wake_waiters()
+
+    def on_rate_limited(self):
+        with self._lock:
+            self._decrease(0.5)
+
+    def _decrease(self, factor: float):
+        # only back off once per cooldown, as a burst of 429s is one signal
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
+        logging.info("Reduced LLM concurrency to %d", int(self.limit))
+
+
+def _burst_bucket(per_minute: float | None) -> TokenBucket | None:
+    if not per_minute:
+        return None
+    return TokenBucket(per_minute, max(1.0, per_minute / 60 * BURST_SECONDS))
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class RateLimiter:
+    """Keeps LLM calls within request and token per-minute budgets.
+
+    Every call reserves one request and its estimated tokens, runs within
+    the adaptive concurrency limit and is retried with jittered exponential
+    backoff when the API answers with a rate-limit error. The buckets hold
+    `BURST_SECONDS` of budget, which is all that can go out at once after
+    the start or an idle period.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_concurrency: int = 64,
+        min_concurrency: int = 1,
+        latency_target: float | None = None,
+        max_retries: int = 6,
+        max_backoff: float = 60.0,
+    ):
+        self.requests = _burst_bucket(requests_per_minute)
+        self.tokens = _burst_bucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(
+            max_concurrency, min_concurrency, latency_target=latency_target
+        )
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.rate_limited = 0
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, 2**attempt))
+
+    def call(self, fn: Callable[[], T], tokens: int = 0) -> T:
+        for attempt in range(self.max_retries + 1):
+            if self.requests:
+                self.requests.acquire()
+            if self.tokens and tokens:
+                self.tokens.acquire(tokens)
+
+            self.concurrency.acquire()
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as exc:
+                if not is_rate_limit_error(exc) or attempt == self.max_retries:
+                    raise
+                self.rate_limited += 1
+                self.concurrency.on_rate_limited()
+            else:
+                self.concurrency.on_success(time.monotonic() - start)
+                return result
+            finally:
+                self.concurrency.release()
+
+            time.sleep(self._backoff(attempt))
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        for attempt in range(self.max_retries + 1):
+            if self.requests:
+                await self.requests.aacquire()
+            if self.tokens and tokens:
+                await self.tokens.aacquire(tokens)
+
+            await self.concurrency.aacquire()
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as exc:
+                if not is_rate_limit_error(exc) or attempt == self.max_retries:
+                    raise
+                self.rate_limited += 1
+                self.concurrency.on_rate_limited()
+            else:
+                self.concurrency.on_success(time.monotonic() - start)
+                return result
+            finally:
+                self.concurrency.release()
+
+            await asyncio.sleep(self._backoff(attempt))
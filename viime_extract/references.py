@@ -1,10 +1,28 @@
+import re
+from logging import getLogger
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Callable, Generator, Literal, Optional
 
 from langchain_core.documents.base import Document
 from langchain_core.language_models.chat_models import BaseChatModel
 
 from viime_extract.config import Prompt
+from viime_extract.llm import ainvoke_structured, invoke_structured
+
+logging = getLogger(__name__)
+
+REFERENCES_HEADING_RE = re.compile(
+    r"^[\s#*]*(?:\d+\.?\s*)?(?:references|bibliography|literature cited|"
+    r"works cited|reference list|references and notes)[\s*:]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+CITATION_START_RE = re.compile(r"^\s*(?:\[\d{1,3}\]|\d{1,3}[.)])\s+\S")
+DOI_RE = re.compile(r"\b(?:doi:?\s*|https?://(?:dx\.)?doi\.org/)10\.\d{4,9}/", re.I)
+YEAR_RE = re.compile(r"\(?\b(?:19|20)\d{2}[a-z]?\b[).;,:]")
+AUTHOR_RE = re.compile(r"\b[A-Z][A-Za-z'\u2019-]+,?\s+(?:[A-Z]\.?\s?){1,3}[,;.]")
+
+# pages scoring at least this are treated as bibliography pages
+REFERENCES_PAGE_SCORE = 0.5
 
 
 class Reference(BaseModel):
@@ -55,15 +73,260 @@ class References(BaseModel):
 def extract_references(page: Document, model: BaseChatModel, prompt: Prompt):
     template = prompt.get_template()
     llm_input = template.invoke({"article_contents": page})
-    return model.with_structured_output(References).invoke(llm_input)
+    return invoke_structured(model, References, llm_input, stage="references")
+
+
+async def aextract_references(page: Document, model: BaseChatModel, prompt: Prompt):
+    template = prompt.get_template()
+    llm_input = await template.ainvoke({"article_contents": page})
+    return await ainvoke_structured(model, References, llm_input, stage="references")
+
+
+def _bisect_search(num_pages: int) -> Generator[int, bool, int]:
+    """Finds the first page of the trailing references section.
+
+    Assumes that "is a references page" is monotone over the page suffix:
+    once the references start, every following page is a references page.
+    Gallops backwards from the last page (1, 2, 4, ... pages from the end)
+    until a page without references is found, then bisects the remaining
+    interval, so only O(log n) pages are probed.
+
+    Yields page indices to probe and expects to be sent whether the page
+    contains complete references. Returns the same index as the linear
+    back-to-front scan.
+    """
+    # invariant: pages[hi:] are references pages, pages[lo - 1] is not
+    lo, hi = 0, num_pages
+    step = 1
+    while hi > 0:
+        probe = max(num_pages - step, 0)
+        if (yield probe):
+            hi = probe
+            if probe == 0:
+                return 0
+            step *= 2
+        else:
+            lo = probe + 1
+            break
+
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if (yield mid):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def _has_complete_references(refs: References) -> bool:
+    return len(refs.complete_references) > 0
 
 
 def get_start_of_references_idx(
-    pages: list[Document], model: BaseChatModel, prompt: Prompt
+    pages: list[Document],
+    model: BaseChatModel,
+    prompt: Prompt,
+    search: Literal["linear", "bisect"] = "linear",
+    on_lower_bound: Callable[[int], None] | None = None,
 ):
+    """Returns the index of the first page of the trailing references.
+
+    With `search="bisect"`, `on_lower_bound(idx)` is called whenever the
+    search learns that every page before `idx` precedes the references.
+    """
+    if search == "bisect":
+        search_plan = _bisect_search(len(pages))
+        try:
+            probe = next(search_plan)
+            while True:
+                refs = extract_references(pages[probe], model, prompt)
+                has_refs = _has_complete_references(refs)
+                if not has_refs and on_lower_bound is not None:
+                    on_lower_bound(probe + 1)
+                probe = search_plan.send(has_refs)
+        except StopIteration as stop:
+            return stop.value
+
     for ridx, page in enumerate(pages[::-1]):
         refs = extract_references(page, model, prompt)
         if len(refs.complete_references) == 0:
             # pick the page index after the current page
             return len(pages) - ridx
     return 0
+
+
+async def aget_start_of_references_idx(
+    pages: list[Document],
+    model: BaseChatModel,
+    prompt: Prompt,
+    search: Literal["linear", "bisect"] = "linear",
+    on_lower_bound: Callable[[int], None] | None = None,
+):
+    if search == "bisect":
+        search_plan = _bisect_search(len(pages))
+        try:
+            probe = next(search_plan)
+            while True:
+                refs = await aextract_references(pages[probe], model, prompt)
+                has_refs = _has_complete_references(refs)
+                if not has_refs and on_lower_bound is not None:
+                    on_lower_bound(probe + 1)
+                probe = search_plan.send(has_refs)
+        except StopIteration as stop:
+            return stop.value
+
+    for ridx, page in enumerate(pages[::-1]):
+        refs = await aextract_references(page, model, prompt)
+        if len(refs.complete_references) == 0:
+            # pick the page index after the current page
+            return len(pages) - ridx
+    return 0
+
+
+def score_references_page(text: str) -> float:
+    """Scores how much a page looks like a bibliography, from 0 to 1.
+
+    Counts numbered citation markers, DOIs, publication years and
+    "Surname I." author groups per line of text.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return 0.0
+
+    hits = 0.0
+    for line in lines:
+        hits += 1 if CITATION_START_RE.match(line) else 0
+        hits += 1 if DOI_RE.search(line) else 0
+        hits += 0.5 * min(len(YEAR_RE.findall(line)), 1)
+        hits += 0.5 * min(len(AUTHOR_RE.findall(line)), 2)
+    return min(hits / len(lines), 1.0)
+
+
+def _has_citations_after_heading(text: str) -> bool:
+    headings = list(REFERENCES_HEADING_RE.finditer(text))
+    if not headings:
+        return False
+    return score_references_page(text[headings[-1].end() :]) >= REFERENCES_PAGE_SCORE
+
+
+class ReferencesLocation(BaseModel):
+    index: int = Field(description="Index of the first references page")
+    method: Literal["heuristic", "llm"] = Field(
+        description="Which detector produced the index"
+    )
+    confidence: Optional[float] = Field(
+        default=None, description="Confidence of the heuristic detector"
+    )
+
+
+def locate_references_heuristic(pages: list[Document]) -> ReferencesLocation:
+    """Locates the trailing references section without calling an LLM.
+
+    Returns the index that `get_start_of_references_idx` would return,
+    along with a confidence in [0, 1]. The confidence is high only when a
+    references heading lines up with a run of bibliography-like pages at
+    the end of the article, or when no page looks like a bibliography.
+    """
+    num_pages = len(pages)
+    scores = [score_references_page(page.page_content) for page in pages]
+    is_references = [score >= REFERENCES_PAGE_SCORE for score in scores]
+
+    start = num_pages
+    while start > 0 and is_references[start - 1]:
+        start -= 1
+
+    heading = None
+    for idx in range(num_pages - 1, -1, -1):
+        if REFERENCES_HEADING_RE.search(pages[idx].page_content):
+            heading = idx
+            break
+
+    if start == num_pages:
+        # the last page doesn't look like references
+        if heading is None and max(scores, default=0) < REFERENCES_PAGE_SCORE / 2:
+            confidence = 0.9
+        else:
+            confidence = 0.4
+        return ReferencesLocation(
+            index=num_pages, method="heuristic", confidence=confidence
+        )
+
+    if heading is not None and heading in (start - 1, start):
+        # the heading page belongs to the references if citations follow it
+        if heading == start - 1 and _has_citations_after_heading(
+            pages[heading].page_content
+        ):
+            start = heading
+        return ReferencesLocation(index=start, method="heuristic", confidence=0.9)
+
+    if heading is None:
+        confidence = 0.6 if min(scores[start:]) >= 0.8 else 0.5
+    else:
+        # a heading that is far from the bibliography-like tail is ambiguous
+        confidence = 0.3
+    return ReferencesLocation(index=start, method="heuristic", confidence=confidence)
+
+
+def find_start_of_references(
+    pages: list[Document],
+    model: BaseChatModel,
+    prompt: Prompt,
+    detector: Literal["llm", "heuristic"] = "llm",
+    search: Literal["linear", "bisect"] = "linear",
+    min_confidence: float = 0.75,
+    on_lower_bound: Callable[[int], None] | None = None,
+) -> ReferencesLocation:
+    """Finds the first references page, trying the heuristic detector first.
+
+    With `detector="heuristic"` the LLM is only asked when the heuristic
+    confidence is below `min_confidence`.
+    """
+    if detector == "heuristic":
+        location = locate_references_heuristic(pages)
+        if location.confidence >= min_confidence:
+            logging.info(
+                "References located at page index %d by heuristic (confidence %.2f)",
+                location.index,
+                location.confidence,
+            )
+            return location
+        logging.info(
+            "Heuristic references confidence %.2f is below %.2f, asking the LLM",
+            location.confidence,
+            min_confidence,
+        )
+
+    index = get_start_of_references_idx(
+        pages, model, prompt, search, on_lower_bound=on_lower_bound
+    )
+    return ReferencesLocation(index=index, method="llm")
+
+
+async def afind_start_of_references(
+    pages: list[Document],
+    model: BaseChatModel,
+    prompt: Prompt,
+    detector: Literal["llm", "heuristic"] = "llm",
+    search: Literal["linear", "bisect"] = "linear",
+    min_confidence: float = 0.75,
+    on_lower_bound: Callable[[int], None] | None = None,
+) -> ReferencesLocation:
+    if detector == "heuristic":
+        location = locate_references_heuristic(pages)
+        if location.confidence >= min_confidence:
+            logging.info(
+                "References located at page index %d by heuristic (confidence %.2f)",
+                location.index,
+                location.confidence,
+            )
+            return location
+        logging.info(
+            "Heuristic references confidence %.2f is below %.2f, asking the LLM",
+            location.confidence,
+            min_confidence,
+        )
+
+    index = await aget_start_of_references_idx(
+        pages, model, prompt, search, on_lower_bound=on_lower_bound
+    )
+    return ReferencesLocation(index=index, method="llm")
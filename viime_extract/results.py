@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+from collections.abc import Iterator, Mapping
+from logging import getLogger
+from pathlib import Path
+from typing import Any
+
+logging = getLogger(__name__)
+
+
+class ResultStore(Mapping):
+    """An append-only JSONL store of per-document results.
+
+    Each line is a `{key_field: key, value_field: value}` record. A sidecar
+    `<path>.idx` file maps keys to byte offsets, so single results can be
+    read without loading the whole file and appends stay O(1). Writes are
+    flushed every record and fsynced every `sync_every` records.
+
+    A key that is written twice resolves to its latest record. The index is
+    rebuilt from the data file whenever it is missing or behind it.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        key_field: str = "PMID",
+        value_field: str = "keywords",
+        sync_every: int = 64,
+        readonly=False,
+    ):
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self.key_field = key_field
+        self.value_field = value_field
+        self.sync_every = sync_every
+        self.readonly = readonly
+
+        self._lock = threading.Lock()
+        self._offsets: dict[str, tuple[int, int]] = {}
+        self._unsynced = 0
+        self._data_fp = None
+        self._index_fp = None
+
+        if not readonly:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.touch()
+        self._load_index()
+        self._read_fp = open(self.path, "rb") if self.path.exists() else None
+
+    def _load_index(self):
+        size = self.path.stat().st_size if self.path.exists() else 0
+        indexed = 0
+        if self.index_path.exists():
+            with open(self.index_path, "r", encoding="utf-8") as fp:
+                for line in fp:
+                    try:
+                        key, offset, length = json.loads(line)
+                    except ValueError:
+                        break
+                    if offset + length > size:
+                        break
+                    self._offsets[key] = (offset, length)
+                    indexed = max(indexed, offset + length)
+
+        if indexed < size:
+            self._scan(indexed, size)
+
+    def _scan(self, start: int, size: int):
+        logging.info('Indexing "%s" from byte %d', self.path, start)
+        new_entries = []
+        with open(self.path, "rb") as fp:
+            fp.seek(start)
+            offset = start
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    key = json.loads(line)[self.key_field]
+                except (ValueError, KeyError):
+                    logging.warning("Skipping a malformed record at byte %d", offset)
+                else:
+                    self._offsets[key] = (offset, len(line))
+                    new_entries.append((key, offset, len(line)))
+                offset += len(line)
+
+        if self.readonly:
+            return
+        if offset < size:
+            # a half-written last record from an interrupted run
+            logging.warning('Truncating a partial record at the end of "%s"', self.path)
+            os.truncate(self.path, offset)
+        with open(self.index_path, "a", encoding="utf-8") as fp:
+            for entry in new_entries:
+                fp.write(json.dumps(entry) + "\n")
+
+    def append(self, key: str, value: Any):
+        if self.readonly:
+            raise ValueError(f'"{self.path}" was opened read-only')
+
+        line = json.dumps({self.key_field: key, self.value_field: value}) + "\n"
+        data = line.encode("utf-8")
+        with self._lock:
+            if self._data_fp is None:
+                self._data_fp = open(self.path, "ab")
+                self._index_fp = open(self.index_path, "a", encoding="utf-8")
+
+            offset = self._data_fp.tell()
+            self._data_fp.write(data)
+            self._data_fp.flush()
+            self._index_fp.write(json.dumps([key, offset, len(data)]) + "\n")
+            self._index_fp.flush()
+            self._offsets[key] = (offset, len(data))
+
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                self._sync()
+
+    def _sync(self):
+        if self._data_fp is not None:
+            os.fsync(self._data_fp.fileno())
+            os.fsync(self._index_fp.fileno())
+        self._unsynced = 0
+
+    def flush(self):
+        with self._lock:
+            self._sync()
+
+    def _read_record(self, offset: int, length: int) -> dict:
+        if self._read_fp is None:
+            self._read_fp = open(self.path, "rb")
+        return json.loads(os.pread(self._read_fp.fileno(), length, offset))
+
+    def __getitem__(self, key: str) -> Any:
+        offset, length = self._offsets[key]
+        return self._read_record(offset, length)[self.value_field]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def items(self) -> Iterator[tuple[str, Any]]:
+        """Streams `(key, value)` pairs in write order, one line at a time."""
+        offset = 0
+        with open(self.path, "rb") as fp:
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                key = record.get(self.key_field)
+                # skip records that were superseded by a later write
+                if self._offsets.get(key, (None,))[0] == offset:
+                    yield key, record[self.value_field]
+                offset += len(line)
+
+    def values(self) -> Iterator[Any]:
+        return (value for _, value in self.items())
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            for fp in (self._data_fp, self._index_fp, self._read_fp):
+                if fp is not None:
+                    fp.close()
+            self._data_fp = self._index_fp = self._read_fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_results(path: Path | str) -> Mapping[str, Any]:
+    """Opens extraction results from a JSONL store or a PMID to results JSON."""
+    path = Path(path)
+    if path.suffix == ".jsonl":
+        return ResultStore(path, readonly=True)
+    return json.loads(path.read_bytes())
@@ -0,0 +1,175 @@
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging import getLogger
+from pathlib import Path
+
+import click
+import tomllib
+from langchain_core.documents.base import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_text_splitters.base import TextSplitter
+
+from viime_extract.config import Config, Prompt
+from viime_extract.extract import (
+    extract_article_keywords_from_doc,
+    merge_chunk_keywords,
+)
+from viime_extract.llm import configure, get_response_cache
+from viime_extract.results import ResultStore
+from viime_extract.schema import ArticleKeyWords
+
+logging = getLogger(__name__)
+
+
+def extract_abstract_keywords(
+    abstract: str,
+    model: BaseChatModel,
+    splitter: TextSplitter | None,
+    prompt: Prompt,
+    track_mentions=False,
+) -> ArticleKeyWords:
+    doc = Document(abstract)
+    chunks = [doc] if splitter is None else splitter.split_documents([doc])
+    return merge_chunk_keywords(
+        (extract_article_keywords_from_doc(chunk, model, prompt) for chunk in chunks),
+        track_mentions,
+    )
+
+
+def run_csv_abstract_extraction(
+    csv_file: Path,
+    config: Config,
+    model: BaseChatModel,
+    output_file: Path,
+    checkpoint_file: Path,
+    jobs: int = 8,
+    chunk_size: int = 2048,
+):
+    """Extracts keywords from every abstract in a PubMed CSV export.
+
+    Abstracts are processed on a pool of `jobs` threads and each result is
+    appended to the `checkpoint_file` result store as it completes. PMIDs
+    already in the store are skipped, so an interrupted run can simply be
+    restarted. Unless the store is the output itself, the PMID to keywords
+    mapping is written to `output_file` as JSON at the end.
+
+    A `chunk_size` of 0 sends every abstract to the model in one piece.
+    """
+    with open(csv_file, "r", encoding="utf-8") as fp:
+        rows = list(csv.DictReader(fp))
+
+    splitter = (
+        RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+        if chunk_size
+        else None
+    )
+    prompt = config.prompts.article_keywords
+    linker = config.normalization.create_linker()
+    failures = 0
+
+    with (
+        ResultStore(checkpoint_file) as results,
+        ThreadPoolExecutor(max_workers=jobs) as executor,
+    ):
+        todo = {
+            row["PMID"]: row["Abstract"] for row in rows if row["PMID"] not in results
+        }
+        logging.info(
+            "%d abstracts already done, %d to process",
+            len(rows) - len(todo),
+            len(todo),
+        )
+
+        futures = {
+            executor.submit(
+                extract_abstract_keywords,
+                abstract,
+                model,
+                splitter,
+                prompt,
+                config.extractor.track_mentions,
+            ): pmid
+            for pmid, abstract in todo.items()
+        }
+        for future in as_completed(futures):
+            pmid = futures[future]
+            try:
+                keywords = future.result()
+            except Exception:
+                failures += 1
+                logging.exception("Extraction failed for PMID %s", pmid)
+                continue
+
+            if linker is not None:
+                linker.link_keywords(keywords)
+            results.append(pmid, json.loads(keywords.model_dump_json()))
+            logging.info("Finished %s (processed %d)", pmid, len(results))
+
+        if output_file != checkpoint_file:
+            # keep the CSV order in the output, like the sequential runner did
+            outputs = {
+                row["PMID"]: results[row["PMID"]]
+                for row in rows
+                if row["PMID"] in results
+            }
+            with open(output_file, "w", encoding="utf-8") as fp:
+                fp.write(json.dumps(outputs))
+
+    return failures
+
+
+@click.command()
+@click.argument("csv_file")
+@click.option("-c", "--config-file", required=True)
+@click.option("-o", "--output-file", required=True)
+@click.option(
+    "-j", "--jobs", default=8, type=int, show_default=True, help="Abstracts in flight"
+)
+@click.option(
+    "--checkpoint-file",
+    help="JSONL result store of finished PMIDs"
+    " [default: OUTPUT_FILE if it ends in .jsonl, else OUTPUT_FILE.checkpoint.jsonl]",
+)
+@click.option(
+    "--chunk-size",
+    default=2048,
+    type=int,
+    show_default=True,
+    help="Split abstracts into chunks of this size, 0 to not split",
+)
+def main(
+    csv_file: str,
+    config_file: str,
+    output_file: str,
+    jobs=8,
+    checkpoint_file: str | None = None,
+    chunk_size=2048,
+):
+    with open(config_file, "rb") as fp:
+        config = Config.model_validate(tomllib.load(fp))
+    configure(config)
+
+    model = config.create_model()
+    default_checkpoint = (
+        output_file
+        if output_file.endswith(".jsonl")
+        else f"{output_file}.checkpoint.jsonl"
+    )
+    failures = run_csv_abstract_extraction(
+        Path(csv_file),
+        config,
+        model,
+        Path(output_file),
+        Path(checkpoint_file or default_checkpoint),
+        jobs=jobs,
+        chunk_size=chunk_size,
+    )
+
+    if (cache := get_response_cache()) is not None:
+        logging.info("LLM response cache: %s", cache.stats())
+    if failures:
+        raise click.ClickException(
+            f"{failures} abstracts failed, re-run the same command to retry them"
+        )
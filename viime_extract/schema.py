@@ -1,9 +1,109 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, SerializerFunctionWrapHandler, model_serializer
+from pydantic.json_schema import SkipJsonSchema
+from typing import ClassVar, List, Optional
+
+
+def entity_key(name: str) -> str:
+    """The key entities are deduplicated by: the case-folded name with its
+    whitespace collapsed, so "L-Lactate" and "l-lactate " are one entity."""
+    return " ".join(name.casefold().split())
+
+
+# fields combined across duplicates rather than taken from one of them
+_MERGED_FIELDS = ("name", "mentions", "chunks")
+
+
+class _MergedEntity:
+    """The first of a set of duplicate entities, with what the others add.
+
+    Mention counts are added up and chunk indexes joined; any other field
+    the first entity lacks is taken from the first duplicate that has it.
+    """
+
+    __slots__ = ("entity", "mentions", "chunks", "update")
+
+    def __init__(self, entity: "Entity"):
+        self.entity = entity
+        self.mentions: int | None = None
+        self.chunks: dict[int, None] = {}
+        self.update = {}
+
+    def add(self, entity: "Entity", chunk: int | None = None):
+        if chunk is not None:
+            # a chunk's own response, which counts as one mention
+            self.mentions = (self.mentions or 0) + 1
+            self.chunks[chunk] = None
+        else:
+            if entity.mentions is not None:
+                self.mentions = (self.mentions or 0) + entity.mentions
+            self.chunks.update(dict.fromkeys(entity.chunks or ()))
+
+        if entity is not self.entity:
+            for field in type(entity).model_fields:
+                if (
+                    field not in _MERGED_FIELDS
+                    and field not in self.update
+                    and getattr(self.entity, field) is None
+                    and (value := getattr(entity, field)) is not None
+                ):
+                    self.update[field] = value
+
+    def build(self) -> "Entity":
+        update = dict(self.update)
+        if self.mentions is not None and self.mentions != self.entity.mentions:
+            update["mentions"] = self.mentions
+        if self.chunks and list(self.chunks) != self.entity.chunks:
+            update["chunks"] = list(self.chunks)
+        return self.entity.model_copy(update=update) if update else self.entity
+
+
+def _merge_into(
+    merged: dict[str, _MergedEntity], entities: list | None, chunk: int | None = None
+):
+    for entity in entities or ():
+        key = entity_key(entity.name)
+        if (slot := merged.get(key)) is None:
+            slot = merged[key] = _MergedEntity(entity)
+        slot.add(entity, chunk)
 
 
 def merge_lists(l1: list | None, l2: list | None) -> list:
-    return (l1 or []) + (l2 or [])
+    """Concatenates two entity lists, keeping the first of each duplicate.
+
+    Runs in linear time and is associative, so merging partial results in
+    any grouping gives the same list as long as their order is kept.
+    """
+    merged = {}
+    _merge_into(merged, l1)
+    _merge_into(merged, l2)
+    return [slot.build() for slot in merged.values()]
+
+
+class Entity(BaseModel):
+    """
+    Represents a named entity found in an article.
+    """
+
+    # never asked of the LLM, and left out of the output until they are set
+    hidden_fields: ClassVar[tuple[str, ...]] = ("mentions", "chunks")
+
+    name: str = Field(..., title="Name", description="The name of the entity.")
+    mentions: SkipJsonSchema[Optional[int]] = Field(
+        None, title="Mentions", description="How often the entity was extracted."
+    )
+    chunks: SkipJsonSchema[Optional[List[int]]] = Field(
+        None,
+        title="Chunks",
+        description="The indexes of the chunks the entity was extracted from.",
+    )
+
+    @model_serializer(mode="wrap")
+    def _drop_unset_hidden_fields(self, handler: SerializerFunctionWrapHandler):
+        data = handler(self)
+        for field in self.hidden_fields:
+            if field in data and data[field] is None:
+                del data[field]
+        return data
 
 
 class Person(BaseModel):
@@ -25,18 +125,21 @@ class Person(BaseModel):
     )
 
 
-class Metabolite(BaseModel):
+class Metabolite(Entity):
     """
     Represents a metabolite.
     """
 
+    # filled in by ChEBI normalization
+    hidden_fields = (*Entity.hidden_fields, "chebi_id")
+
     name: str = Field(..., title="Name", description="The name of the metabolite.")
-    # chebi_id: Optional[str] = Field(
-    #     ..., title="ChEBI ID", description="The ChEBI ID of the metabolite."
-    # )
+    chebi_id: SkipJsonSchema[Optional[str]] = Field(
+        None, title="ChEBI ID", description="The ChEBI ID of the metabolite."
+    )
 
 
-class Protein(BaseModel):
+class Protein(Entity):
     """
     Represents a protein.
     """
@@ -47,7 +150,7 @@ class Protein(BaseModel):
     # )
 
 
-class Gene(BaseModel):
+class Gene(Entity):
     """
     Represents a gene.
     """
@@ -58,7 +161,7 @@ class Gene(BaseModel):
     # )
 
 
-class Pathway(BaseModel):
+class Pathway(Entity):
     """
     Represents a pathway.
     """
@@ -77,7 +180,7 @@ class Pathway(BaseModel):
 #    guide_to_pharmacology_id: str = Field(..., title="Guide to Pharmacology ID", description="The Guide to Pharmacology ID of the drug.")
 
 
-class Drug(BaseModel):
+class Drug(Entity):
     """
     Represents a drug.
     """
@@ -88,7 +191,7 @@ class Drug(BaseModel):
     # )
 
 
-class Disease(BaseModel):
+class Disease(Entity):
     """
     Represents a disease.
     """
@@ -168,7 +271,21 @@ class ArticleKeyWords(BaseModel):
         default=None,
     )
 
+    def count_mentions(self, chunk: int) -> "ArticleKeyWords":
+        """Returns a copy whose entities count one mention each, in `chunk`."""
+        return ArticleKeyWords(
+            **{
+                field: [
+                    entity.model_copy(update={"mentions": 1, "chunks": [chunk]})
+                    for entity in entities
+                ]
+                for field in type(self).model_fields
+                if (entities := getattr(self, field)) is not None
+            }
+        )
+
     def merge(self, other: "ArticleKeyWords"):
+        """Merges the entities of both, dropping duplicates (see `merge_lists`)."""
         return ArticleKeyWords(
             mentioned_metabolites=merge_lists(
                 self.mentioned_metabolites, other.mentioned_metabolites
@@ -187,6 +304,35 @@ class ArticleKeyWords(BaseModel):
         )
 
 
+class ArticleKeyWordsAccumulator:
+    """Merges many ArticleKeyWords, such as the responses for every chunk of
+    an article, into one.
+
+    Gives the same result as folding `ArticleKeyWords.merge` over them, but
+    entities are collected in mutable buffers and the merged model is built
+    once by `build`, instead of copying every list on every merge.
+    """
+
+    def __init__(self):
+        self._merged: dict[str, dict[str, _MergedEntity]] = {
+            field: {} for field in ArticleKeyWords.model_fields
+        }
+
+    def add(self, keywords: ArticleKeyWords, chunk: int | None = None):
+        """Adds the entities of `keywords`, counting them as one mention each
+        in `chunk` when it is given (see `ArticleKeyWords.count_mentions`)."""
+        for field, merged in self._merged.items():
+            _merge_into(merged, getattr(keywords, field), chunk)
+
+    def build(self) -> ArticleKeyWords:
+        return ArticleKeyWords(
+            **{
+                field: [slot.build() for slot in merged.values()]
+                for field, merged in self._merged.items()
+            }
+        )
+
+
 class ArticleMeta(BaseModel):
     """
     Represents the metadata of a journal article.